@@ -1,15 +1,35 @@
 from abc import ABC, abstractmethod
+from typing import Callable
 
 from lox.scanner import Token
 
 
 class Expr(ABC):
+    __slots__ = ()
+    kind: int
+
     @abstractmethod
     def accept(self, visitor: 'Visitor'):
         pass
 
 
+VISIT_METHODS = (
+    'visitAssignExpr',
+    'visitBinaryExpr',
+    'visitCallExpr',
+    'visitGroupingExpr',
+    'visitLiteralExpr',
+    'visitLogicalExpr',
+    'visitUnaryExpr',
+    'visitVariableExpr',
+)
+
+
 class Visitor(ABC):
+    def expr_dispatch(self) -> dict[int, Callable]:
+        """按节点的 kind 查找 visit 方法, 省掉 accept 这一层调用"""
+        return {kind: getattr(self, name) for kind, name in enumerate(VISIT_METHODS, 0)}
+
     @abstractmethod
     def visitAssignExpr(expr: 'Assign'):
         pass
@@ -44,6 +64,10 @@ class Visitor(ABC):
 
 
 class Assign(Expr):
+    __slots__ = ('name', 'value')
+    __match_args__ = ('name', 'value')
+    kind = 0
+
     def __init__(self, name: 'Token', value: 'Expr'):
         self.name = name
         self.value = value
@@ -53,16 +77,27 @@ class Assign(Expr):
 
 
 class Binary(Expr):
+    __slots__ = ('left', 'operator', 'right', 'specialized', 'warmup')
+    __match_args__ = ('left', 'operator', 'right')
+    kind = 1
+
     def __init__(self, left: 'Expr', operator: 'Token', right: 'Expr'):
         self.left = left
         self.operator = operator
         self.right = right
+        # 解释器在运行时填写的缓存
+        self.specialized = None
+        self.warmup = None
 
     def accept(self, visitor: 'Visitor'):
         return visitor.visitBinaryExpr(self)
 
 
 class Call(Expr):
+    __slots__ = ('callee', 'paren', 'arguments')
+    __match_args__ = ('callee', 'paren', 'arguments')
+    kind = 2
+
     def __init__(self, callee: 'Expr', paren: 'Token', arguments: 'List[Expr]'):
         self.callee = callee
         self.paren = paren
@@ -73,6 +108,10 @@ class Call(Expr):
 
 
 class Grouping(Expr):
+    __slots__ = ('expression',)
+    __match_args__ = ('expression',)
+    kind = 3
+
     def __init__(self, expression: 'Expr'):
         self.expression = expression
 
@@ -81,6 +120,10 @@ class Grouping(Expr):
 
 
 class Literal(Expr):
+    __slots__ = ('value',)
+    __match_args__ = ('value',)
+    kind = 4
+
     def __init__(self, value: 'object'):
         self.value = value
 
@@ -89,6 +132,10 @@ class Literal(Expr):
 
 
 class Logical(Expr):
+    __slots__ = ('left', 'operator', 'right')
+    __match_args__ = ('left', 'operator', 'right')
+    kind = 5
+
     def __init__(self, left: 'Expr', operator: 'Token', right: 'Expr'):
         self.left = left
         self.operator = operator
@@ -99,6 +146,10 @@ class Logical(Expr):
 
 
 class Unary(Expr):
+    __slots__ = ('operator', 'right')
+    __match_args__ = ('operator', 'right')
+    kind = 6
+
     def __init__(self, operator: 'Token', right: 'Expr'):
         self.operator = operator
         self.right = right
@@ -108,8 +159,15 @@ class Unary(Expr):
 
 
 class Variable(Expr):
+    __slots__ = ('name', 'cached_version', 'cached_value')
+    __match_args__ = ('name',)
+    kind = 7
+
     def __init__(self, name: 'Token'):
         self.name = name
+        # 解释器在运行时填写的缓存
+        self.cached_version = None
+        self.cached_value = None
 
     def accept(self, visitor: 'Visitor'):
         return visitor.visitVariableExpr(self)
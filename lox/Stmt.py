@@ -1,15 +1,36 @@
 from abc import ABC, abstractmethod
+from typing import Callable
 
 from lox.scanner import Token
 
 
 class Stmt(ABC):
+    __slots__ = ()
+    kind: int
+
     @abstractmethod
     def accept(self, visitor: 'Visitor'):
         pass
 
 
+VISIT_METHODS = (
+    'visitBlockStmt',
+    'visitExpressionStmt',
+    'visitForStmt',
+    'visitFunctionStmt',
+    'visitIfStmt',
+    'visitPrintStmt',
+    'visitVarStmt',
+    'visitReturnStmt',
+    'visitWhileStmt',
+)
+
+
 class Visitor(ABC):
+    def stmt_dispatch(self) -> dict[int, Callable]:
+        """按节点的 kind 查找 visit 方法, 省掉 accept 这一层调用"""
+        return {kind: getattr(self, name) for kind, name in enumerate(VISIT_METHODS, 8)}
+
     @abstractmethod
     def visitBlockStmt(stmt: 'Block'):
         pass
@@ -18,6 +39,10 @@ class Visitor(ABC):
     def visitExpressionStmt(stmt: 'Expression'):
         pass
 
+    @abstractmethod
+    def visitForStmt(stmt: 'For'):
+        pass
+
     @abstractmethod
     def visitFunctionStmt(stmt: 'Function'):
         pass
@@ -44,14 +69,24 @@ class Visitor(ABC):
 
 
 class Block(Stmt):
+    __slots__ = ('statements', 'scoped')
+    __match_args__ = ('statements',)
+    kind = 8
+
     def __init__(self, statements: 'List[Stmt]'):
         self.statements = statements
+        # 解释器在运行时填写的缓存
+        self.scoped = None
 
     def accept(self, visitor: 'Visitor'):
         return visitor.visitBlockStmt(self)
 
 
 class Expression(Stmt):
+    __slots__ = ('expression',)
+    __match_args__ = ('expression',)
+    kind = 9
+
     def __init__(self, expression: 'Expr'):
         self.expression = expression
 
@@ -59,7 +94,26 @@ class Expression(Stmt):
         return visitor.visitExpressionStmt(self)
 
 
+class For(Stmt):
+    __slots__ = ('initializer', 'condition', 'increment', 'body')
+    __match_args__ = ('initializer', 'condition', 'increment', 'body')
+    kind = 10
+
+    def __init__(self, initializer: 'Stmt', condition: 'Expr', increment: 'Expr', body: 'Stmt'):
+        self.initializer = initializer
+        self.condition = condition
+        self.increment = increment
+        self.body = body
+
+    def accept(self, visitor: 'Visitor'):
+        return visitor.visitForStmt(self)
+
+
 class Function(Stmt):
+    __slots__ = ('name', 'params', 'body')
+    __match_args__ = ('name', 'params', 'body')
+    kind = 11
+
     def __init__(self, name: 'Token', params: 'List[Token]', body: 'List[Stmt]'):
         self.name = name
         self.params = params
@@ -70,6 +124,10 @@ class Function(Stmt):
 
 
 class If(Stmt):
+    __slots__ = ('condition', 'thenBranch', 'elseBranch')
+    __match_args__ = ('condition', 'thenBranch', 'elseBranch')
+    kind = 12
+
     def __init__(self, condition: 'Expr', thenBranch: 'Stmt', elseBranch: 'Stmt'):
         self.condition = condition
         self.thenBranch = thenBranch
@@ -80,6 +138,10 @@ class If(Stmt):
 
 
 class Print(Stmt):
+    __slots__ = ('expression',)
+    __match_args__ = ('expression',)
+    kind = 13
+
     def __init__(self, expression: 'Expr'):
         self.expression = expression
 
@@ -88,6 +150,10 @@ class Print(Stmt):
 
 
 class Var(Stmt):
+    __slots__ = ('name', 'initializer')
+    __match_args__ = ('name', 'initializer')
+    kind = 14
+
     def __init__(self, name: 'Token', initializer: 'Expr'):
         self.name = name
         self.initializer = initializer
@@ -97,6 +163,10 @@ class Var(Stmt):
 
 
 class Return(Stmt):
+    __slots__ = ('keyword', 'value')
+    __match_args__ = ('keyword', 'value')
+    kind = 15
+
     def __init__(self, keyword: 'Token', value: 'Expr'):
         self.keyword = keyword
         self.value = value
@@ -106,6 +176,10 @@ class Return(Stmt):
 
 
 class While(Stmt):
+    __slots__ = ('condition', 'body')
+    __match_args__ = ('condition', 'body')
+    kind = 16
+
     def __init__(self, condition: 'Expr', body: 'Stmt'):
         self.condition = condition
         self.body = body
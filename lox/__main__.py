@@ -1,3 +1,10 @@
-from lox.core import main
+import sys
+
+if sys.argv[1:2] == ['batch']:
+    from lox.batch import main
+
+    del sys.argv[1]
+else:
+    from lox.core import main
 
 main()
@@ -0,0 +1,134 @@
+"""
+批量运行互相独立的 Lox 脚本, 用进程池分到多个核上.
+
+    python -m lox batch tests/                 目录下 (递归) 的所有 .lox
+    python -m lox batch 'examples/*.lox' -j 4  glob, 最多 4 个进程
+
+每个脚本在工作进程里用一个新建的 Lox (引擎和错误状态) 运行, 脚本之间不共享全局变量.
+脚本的 stdout, stderr 和退出码收集回主进程, 最后输出吞吐量.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List
+
+from lox import core, natives
+
+
+@dataclass(slots=True)
+class Result:
+    path: str
+    status: int
+    stdout: str
+    stderr: str
+    # 工作进程里运行这个脚本花的时间, 秒
+    elapsed: float
+
+
+def find_scripts(patterns: List[str]) -> List[str]:
+    scripts = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            scripts.extend(str(path) for path in sorted(Path(pattern).rglob('*.lox')))
+        else:
+            scripts.extend(sorted(glob.glob(pattern, recursive=True)))
+    # 同一个脚本只运行一次, 保持给出的顺序
+    return list(dict.fromkeys(scripts))
+
+
+def initialize(modules: List[str]):
+    # 用 spawn 启动的工作进程没有继承主进程导入过的原生函数模块
+    natives.load(*modules)
+
+
+def run_script(path: str, engine: str, use_cache: bool) -> Result:
+    # 新的引擎, 不会看到上一个脚本定义的全局变量
+    lox = core.Lox(engine)
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            status = lox.run_file(path, use_cache)
+        except Exception:
+            # 解释器自身的错误 (比如递归太深) 只影响这一个脚本
+            traceback.print_exc()
+            status = 1
+    return Result(path, status, stdout.getvalue(), stderr.getvalue(), time.perf_counter() - start)
+
+
+def run_batch(
+    scripts: List[str],
+    engine: str = 'tree',
+    jobs: int | None = None,
+    use_cache: bool = True,
+    modules: List[str] = (),
+):
+    """按 scripts 的顺序逐个产出 Result, 实际执行是并行的"""
+    with ProcessPoolExecutor(jobs, initializer=initialize, initargs=(list(modules),)) as pool:
+        yield from pool.map(
+            run_script, scripts, [engine] * len(scripts), [use_cache] * len(scripts)
+        )
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(prog='python -m lox batch')
+    parser.add_argument('scripts', nargs='+', help='directories (searched for *.lox) or globs')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help=f'worker processes (default: {os.cpu_count()})',
+    )
+    parser.add_argument(
+        '--engine', choices=core.engines, default='tree', help='execution engine (default: tree)'
+    )
+    parser.add_argument('--no-cache', dest='cache', action='store_false')
+    parser.add_argument('--native', action='append', default=[], metavar='MODULE')
+    parser.add_argument(
+        '--show-output', action='store_true', help="print every script's stdout and stderr"
+    )
+    parser.add_argument(
+        '--json', type=Path, help='write path, exit code, stdout and stderr of every script'
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    scripts = find_scripts(args.scripts)
+    if not scripts:
+        parser.error('no scripts found')
+    natives.load(*args.native)
+
+    results = []
+    start = time.perf_counter()
+    for result in run_batch(scripts, args.engine, args.jobs, args.cache, args.native):
+        results.append(result)
+        print(f'{result.status:>4}{result.elapsed * 1000:>10.1f}ms  {result.path}')
+        if args.show_output or result.status != 0:
+            for line in (result.stdout if args.show_output else '').splitlines():
+                print(f'      | {line}')
+            for line in result.stderr.splitlines():
+                print(f'      ! {line}')
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for result in results if result.status != 0)
+    busy = sum(result.elapsed for result in results)
+    print(
+        f'\n{len(results)} scripts, {len(results) - failed} ok, {failed} failed '
+        f'in {elapsed:.2f}s ({len(results) / elapsed:.1f} scripts/s, '
+        f'{args.jobs} jobs, {busy:.2f}s in scripts, {busy / elapsed:.1f}x)'
+    )
+    if args.json is not None:
+        args.json.write_text(json.dumps([asdict(result) for result in results], indent=2) + '\n')
+    if failed:
+        sys.exit(1)
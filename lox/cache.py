@@ -0,0 +1,136 @@
+"""
+解析结果的磁盘缓存, 类似 __pycache__.
+
+脚本解析出的语句列表用 pickle 存放在脚本所在目录的 __loxcache__ 下, 文件名里带上
+脚本的文件名, 解析器前端, 以及源码和解析器, AST 定义的哈希, 源码或者 lox.parser/lox.Expr/lox.Stmt
+改变后旧的缓存自然失效. 不同前端的缓存分开存放, 换了 --parser 也会真正用那个前端解析一次.
+文件里带有 pickle 数据的校验和, 损坏的缓存当作没有命中, 删掉后重新解析.
+缓存目录的总大小超过上限时, 按最近使用时间淘汰.
+"""
+import gc
+import glob
+import hashlib
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import List
+
+import lox.Expr
+import lox.parser
+import lox.scanner
+import lox.Stmt
+from lox.Stmt import Stmt
+
+# lark 前端不一定能导入, 只读它的源码和语法文件
+LARK_FILES = (
+    Path(__file__).with_name('lark_parser.py'),
+    Path(__file__).resolve().parents[1] / 'lox.lark',
+)
+CACHE_DIR = '__loxcache__'
+# 缓存文件的格式: MAGIC, pickle 数据的 sha256, pickle 数据
+MAGIC = b'LOXAST1\n'
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def _fingerprint() -> bytes:
+    # 节点类的定义变了, 旧的 pickle 就不能再用
+    digest = hashlib.sha256(f'{sys.version_info[:2]}'.encode())
+    for module in (lox.scanner, lox.parser, lox.Expr, lox.Stmt):
+        digest.update(Path(module.__file__).read_bytes())
+    for path in LARK_FILES:
+        if path.exists():
+            digest.update(path.read_bytes())
+    return digest.digest()
+
+
+FINGERPRINT = _fingerprint()
+
+
+def cache_path(script: str, source: str, front_end: str = 'pratt') -> Path:
+    path = Path(script)
+    key = hashlib.sha256(FINGERPRINT + f'{front_end}\0{source}'.encode('utf-8')).hexdigest()[:16]
+    return path.parent / CACHE_DIR / f'{path.name}.{front_end}.{key}.pickle'
+
+
+def load(script: str, source: str, front_end: str = 'pratt') -> List[Stmt] | None:
+    path = cache_path(script, source, front_end)
+    try:
+        data = path.read_bytes()
+    except OSError:
+        # 不存在或者不可读, 当作没有命中
+        return None
+    header = len(MAGIC) + hashlib.sha256().digest_size
+    payload = data[header:]
+    if (
+        data[: len(MAGIC)] != MAGIC
+        or data[len(MAGIC) : header] != hashlib.sha256(payload).digest()
+    ):
+        discard(path)
+        return None
+    # 反序列化会一次性创建大量节点对象, 期间暂停 GC 可以避免反复的无效回收
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        statements = pickle.loads(payload)
+    except Exception:
+        # 校验和对得上却读不出来, 也当作损坏. 缓存不能让运行失败
+        discard(path)
+        return None
+    finally:
+        if enabled:
+            gc.enable()
+    if not isinstance(statements, list) or not all(isinstance(s, Stmt) for s in statements):
+        discard(path)
+        return None
+    try:
+        # 更新访问时间, 淘汰时按它排序. 别人写的缓存可能改不了
+        os.utime(path)
+    except OSError:
+        pass
+    return statements
+
+
+def discard(path: Path):
+    # 损坏的缓存文件删掉, 删不掉 (比如别人写的) 也没关系
+    try:
+        path.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def store(script: str, source: str, statements: List[Stmt], front_end: str = 'pratt'):
+    path = cache_path(script, source, front_end)
+    try:
+        payload = pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+        # 嵌套太深的语法树不缓存
+        return
+    try:
+        path.parent.mkdir(exist_ok=True)
+        # 同一个脚本, 同一个前端的旧版本缓存已经没用了
+        for stale in path.parent.glob(f'{glob.escape(Path(script).name)}.{front_end}.*.pickle'):
+            stale.unlink(missing_ok=True)
+        temp = path.with_suffix(f'.{os.getpid()}.tmp')
+        temp.write_bytes(MAGIC + hashlib.sha256(payload).digest() + payload)
+        os.replace(temp, path)
+        evict(path.parent)
+    except OSError:
+        # 目录不可写时静默跳过, 和 __pycache__ 的行为一致
+        pass
+
+
+def evict(directory: Path, max_size: int = MAX_CACHE_SIZE):
+    entries = []
+    for path in directory.glob('*.pickle'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_size:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
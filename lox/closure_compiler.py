@@ -0,0 +1,423 @@
+import operator
+from typing import Callable, List
+
+from lox import natives
+from lox.error import LoxRuntimeError, runtime_error
+from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
+from lox.Expr import Visitor as eVisitor
+from lox.interpreter import Environment, GlobalEnvironment, LoxCallable, divide, stringify
+from lox.output import StdoutOutput
+from lox.scanner import Token, TokenType
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var
+from lox.Stmt import Visitor as sVisitor
+from lox.Stmt import While
+
+# 编译后的表达式: env -> value
+# 编译后的语句: env -> None, 遇到 return 时返回 (value,)
+Code = Callable[[Environment], object]
+
+
+class CompiledFunction(LoxCallable):
+    def __init__(self, declaration: Function, body: Code, closure: Environment):
+        self.declaration = declaration
+        self.body = body
+        self.closure = closure
+        self.params = len(declaration.params)
+
+    def call(self, interpreter, arguments: List[object]) -> object:
+        # 参数就是新环境的前几个 slot
+        result = self.body(Environment(self.closure, arguments))
+        return None if result is None else result[0]
+
+    def arity(self):
+        return self.params
+
+    def __str__(self):
+        return f'<fn {self.declaration.name.lexeme}>'
+
+
+class ClosureInterpreter(eVisitor, sVisitor):
+    """
+    另一种执行引擎: 先把整棵语法树编译成嵌套的 Python 闭包, 再直接调用闭包执行.
+    运算符和变量位置在编译期就确定下来, 运行时不再有 accept/visit 分派和 match.
+    语义和 Interpreter 保持一致.
+    """
+
+    def __init__(self):
+        self.globals_ = GlobalEnvironment()
+        # Resolver 的结果: 局部变量表达式 -> (depth, slot)
+        self.locals: dict[Expr, tuple[int, int]] = {}
+        # 编译期的作用域深度, 0 表示全局
+        self.scope_depth = 0
+        self.output = StdoutOutput()
+
+        for name, function in natives.load().items():
+            self.define_native(name, function)
+
+    def define_native(self, name: str, function: LoxCallable):
+        self.globals_.define(name, function)
+
+    def stringify(self, obj: object) -> str:
+        return stringify(obj)
+
+    def resolve(self, expr: Expr, depth: int, slot: int):
+        self.locals[expr] = (depth, slot)
+
+    def interpret(self, statements: List[Stmt]):
+        code = [self.compile_stmt(statement) for statement in statements]
+        environment = self.globals_
+        try:
+            for statement in code:
+                statement(environment)
+        except LoxRuntimeError as e:
+            runtime_error(e)
+        finally:
+            self.output.flush()
+
+    def compile(self, expr: Expr) -> Code:
+        return expr.accept(self)
+
+    def compile_stmt(self, stmt: Stmt) -> Code:
+        return stmt.accept(self)
+
+    def compile_sequence(self, statements: List[Stmt]) -> Code:
+        code = tuple(self.compile_stmt(statement) for statement in statements)
+        if len(code) == 1:
+            return code[0]
+
+        def sequence(env):
+            for statement in code:
+                result = statement(env)
+                if result is not None:
+                    return result
+
+        return sequence
+
+    def visitBlockStmt(self, stmt: Block):
+        if not stmt.scoped:
+            # 没有声明变量的块不需要新环境
+            return self.compile_sequence(stmt.statements)
+        self.scope_depth += 1
+        body = self.compile_sequence(stmt.statements)
+        self.scope_depth -= 1
+
+        def block(env):
+            return body(Environment(env))
+
+        return block
+
+    def visitExpressionStmt(self, stmt: Expression):
+        expression = self.compile(stmt.expression)
+
+        def expression_stmt(env):
+            expression(env)
+
+        return expression_stmt
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.scope_depth += 1
+        body = self.compile_sequence(stmt.body)
+        self.scope_depth -= 1
+        declare = self.declare(stmt.name)
+
+        def function(env):
+            declare(env, CompiledFunction(stmt, body, env))
+
+        return function
+
+    def visitIfStmt(self, stmt: If):
+        condition = self.compile(stmt.condition)
+        then_branch = self.compile_stmt(stmt.thenBranch)
+        if stmt.elseBranch is None:
+
+            def if_(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+
+            return if_
+
+        else_branch = self.compile_stmt(stmt.elseBranch)
+
+        def if_else(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+
+        return if_else
+
+    def visitPrintStmt(self, stmt: Print):
+        expression = self.compile(stmt.expression)
+
+        def print_(env):
+            self.output.print(stringify(expression(env)))
+
+        return print_
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value is None:
+            return lambda env: (None,)
+        value = self.compile(stmt.value)
+
+        def return_(env):
+            return (value(env),)
+
+        return return_
+
+    def visitVarStmt(self, stmt: Var):
+        declare = self.declare(stmt.name)
+        if stmt.initializer is None:
+            return lambda env: declare(env, None)
+        initializer = self.compile(stmt.initializer)
+
+        def var(env):
+            declare(env, initializer(env))
+
+        return var
+
+    def declare(self, name: Token) -> Callable[[Environment, object], None]:
+        if self.scope_depth > 0:
+
+            def declare_local(env, value):
+                env.values.append(value)
+
+            return declare_local
+
+        values = self.globals_.values
+        lexeme = name.lexeme
+
+        def declare_global(env, value):
+            values[lexeme] = value
+
+        return declare_global
+
+    def visitForStmt(self, stmt: For):
+        scoped = isinstance(stmt.initializer, Var)
+        if scoped:
+            self.scope_depth += 1
+        initializer = None if stmt.initializer is None else self.compile_stmt(stmt.initializer)
+        condition = None if stmt.condition is None else self.compile(stmt.condition)
+        increment = None if stmt.increment is None else self.compile(stmt.increment)
+        body = self.compile_stmt(stmt.body)
+        if scoped:
+            self.scope_depth -= 1
+
+        def loop(env):
+            if initializer is not None:
+                initializer(env)
+            while True:
+                if condition is not None:
+                    value = condition(env)
+                    if value is None or value is False:
+                        return
+                result = body(env)
+                if result is not None:
+                    return result
+                if increment is not None:
+                    increment(env)
+
+        if not scoped:
+            return loop
+
+        def for_(env):
+            # 循环变量的环境只在进入循环时创建一次
+            return loop(Environment(env))
+
+        return for_
+
+    def visitWhileStmt(self, stmt: While):
+        condition = self.compile(stmt.condition)
+        body = self.compile_stmt(stmt.body)
+
+        def while_(env):
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return
+                result = body(env)
+                if result is not None:
+                    return result
+
+        return while_
+
+    def visitLiteralExpr(self, expr: Literal):
+        value = expr.value
+        return lambda env: value
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.compile(expr.expression)
+
+    def visitVariableExpr(self, expr: Variable):
+        location = self.locals.get(expr)
+        if location is None:
+            values = self.globals_.values
+            name = expr.name
+            lexeme = name.lexeme
+
+            def global_(env):
+                try:
+                    return values[lexeme]
+                except KeyError:
+                    raise LoxRuntimeError(name, f'Undefined variable "{lexeme}".') from None
+
+            return global_
+
+        depth, slot = location
+        if depth == 0:
+            return lambda env: env.values[slot]
+        if depth == 1:
+            return lambda env: env.enclosing.values[slot]
+        return lambda env: env.ancestor(depth).values[slot]
+
+    def visitAssignExpr(self, expr: Assign):
+        value = self.compile(expr.value)
+        location = self.locals.get(expr)
+        if location is None:
+            values = self.globals_.values
+            name = expr.name
+            lexeme = name.lexeme
+
+            def assign_global(env):
+                result = value(env)
+                if lexeme not in values:
+                    raise LoxRuntimeError(name, f'Undefined variable "{lexeme}".')
+                values[lexeme] = result
+                return result
+
+            return assign_global
+
+        depth, slot = location
+        if depth == 0:
+
+            def assign_local(env):
+                result = env.values[slot] = value(env)
+                return result
+
+            return assign_local
+
+        def assign_enclosing(env):
+            result = env.ancestor(depth).values[slot] = value(env)
+            return result
+
+        return assign_enclosing
+
+    def visitUnaryExpr(self, expr: Unary):
+        right = self.compile(expr.right)
+        operator = expr.operator
+        match operator.type:
+            case TokenType.MINUS:
+
+                def negate(env):
+                    value = right(env)
+                    if type(value) is float:
+                        return -value
+                    raise LoxRuntimeError(operator, 'Operand must be a number.')
+
+                return negate
+            case TokenType.BANG:
+
+                def not_(env):
+                    value = right(env)
+                    return value is None or value is False
+
+                return not_
+
+    def visitBinaryExpr(self, expr: Binary):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        operator = expr.operator
+
+        if operator.type == TokenType.PLUS:
+
+            def add(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a + b
+                if type(a) is str and type(b) is str:
+                    return a + b
+                raise LoxRuntimeError(operator, 'Operands must be two numbers or strings.')
+
+            return add
+
+        # 其余运算符都要求两个操作数是数字, 具体运算在编译期选好
+        op = _NUMBER_OPERATORS[operator.type]
+
+        def binary(env):
+            a = left(env)
+            b = right(env)
+            if type(a) is float and type(b) is float:
+                return op(a, b)
+            raise LoxRuntimeError(operator, 'Operands must be a number.')
+
+        return binary
+
+    def visitLogicalExpr(self, expr: Logical):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        if expr.operator.type == TokenType.OR:
+
+            def or_(env):
+                value = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+
+            return or_
+
+        def and_(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+
+        return and_
+
+    def visitCallExpr(self, expr: Call):
+        callee = self.compile(expr.callee)
+        arguments = tuple(self.compile(argument) for argument in expr.arguments)
+        paren = expr.paren
+        count = len(arguments)
+
+        def call(env):
+            function = callee(env)
+            values = [argument(env) for argument in arguments]
+            if type(function) is CompiledFunction:
+                # 快速路径: 直接执行编译好的函数体, 不经过 LoxCallable.call
+                if count != function.params:
+                    raise LoxRuntimeError(
+                        paren, f'Expected {function.params} arguments but got {count}.'
+                    )
+                try:
+                    result = function.body(Environment(function.closure, values))
+                except RecursionError:
+                    raise LoxRuntimeError(paren, 'Stack overflow.') from None
+                return None if result is None else result[0]
+            if not isinstance(function, LoxCallable):
+                raise LoxRuntimeError(paren, 'Can only call functions and classes.')
+            if count != function.arity():
+                raise LoxRuntimeError(
+                    paren, f'Expected {function.arity()} arguments but got {count}.'
+                )
+            try:
+                return function.call(self, values)
+            except LoxRuntimeError as e:
+                if e.token is None:
+                    e.token = paren
+                raise
+
+        return call
+
+
+_NUMBER_OPERATORS = {
+    TokenType.MINUS: operator.sub,
+    TokenType.SLASH: divide,
+    TokenType.STAR: operator.mul,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.EQUAL_EQUAL: operator.eq,
+}
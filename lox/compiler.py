@@ -0,0 +1,477 @@
+from array import array
+from enum import Enum
+from typing import List
+
+from lox.error import report
+from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
+from lox.Expr import Visitor as eVisitor
+from lox.scanner import Token, TokenType
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var
+from lox.Stmt import Visitor as sVisitor
+from lox.Stmt import While
+
+# 操作码, 后面注释里是操作数的字节数
+(
+    OP_CONSTANT,  # 2: 常量下标
+    OP_NIL,
+    OP_TRUE,
+    OP_FALSE,
+    OP_POP,
+    OP_GET_LOCAL,  # 1: slot
+    OP_SET_LOCAL,  # 1: slot
+    OP_GET_GLOBAL,  # 2: 变量名常量下标
+    OP_DEFINE_GLOBAL,  # 2: 变量名常量下标
+    OP_SET_GLOBAL,  # 2: 变量名常量下标
+    OP_GET_UPVALUE,  # 1: upvalue 下标
+    OP_SET_UPVALUE,  # 1: upvalue 下标
+    OP_EQUAL,
+    OP_NOT_EQUAL,
+    OP_GREATER,
+    OP_GREATER_EQUAL,
+    OP_LESS,
+    OP_LESS_EQUAL,
+    OP_ADD,
+    OP_SUBTRACT,
+    OP_MULTIPLY,
+    OP_DIVIDE,
+    OP_NOT,
+    OP_NEGATE,
+    OP_PRINT,
+    OP_JUMP,  # 2: 向前跳转的偏移
+    OP_JUMP_IF_FALSE,  # 2: 向前跳转的偏移
+    OP_LOOP,  # 2: 向后跳转的偏移
+    OP_CALL,  # 1: 参数个数
+    OP_CLOSURE,  # 2: 函数常量下标, 然后每个 upvalue 2 字节 (is_local, index)
+    OP_CLOSE_UPVALUE,
+    OP_RETURN,
+    OP_TAIL_CALL,  # 1: 参数个数, 后面紧跟一条 OP_RETURN
+) = range(33)
+
+OP_NAMES = [name for name in globals() if name.startswith('OP_') and name != 'OP_NAMES']
+
+UINT8_MAX = 0xFF
+UINT16_MAX = 0xFFFF
+
+
+class Chunk:
+    """
+    一段字节码: code 是操作码和操作数, lines 和 code 一一对应记录源码行号,
+    constants 是常量池.
+    """
+
+    def __init__(self):
+        self.code = array('B')
+        self.lines = array('I')
+        self.constants: List[object] = []
+        self.constant_indexes: dict[tuple[type, object], int] = {}
+
+    def write(self, byte: int, line: int):
+        self.code.append(byte)
+        self.lines.append(line)
+
+    def add_constant(self, value: object) -> int:
+        # 数字和字符串常量去重, 函数对象不去重. 用 repr 比较, 0.0 和 -0.0 不能合并
+        key = (type(value), repr(value)) if isinstance(value, (float, str)) else None
+        if key is not None and key in self.constant_indexes:
+            return self.constant_indexes[key]
+        self.constants.append(value)
+        index = len(self.constants) - 1
+        if key is not None:
+            self.constant_indexes[key] = index
+        return index
+
+    def disassemble(self, name: str) -> str:
+        lines = [f'== {name} ==']
+        offset = 0
+        while offset < len(self.code):
+            op = self.code[offset]
+            text = f'{offset:04d} {self.lines[offset]:4d} {OP_NAMES[op]}'
+            if op in (
+                OP_GET_LOCAL,
+                OP_SET_LOCAL,
+                OP_GET_UPVALUE,
+                OP_SET_UPVALUE,
+                OP_CALL,
+                OP_TAIL_CALL,
+            ):
+                text += f' {self.code[offset + 1]}'
+                offset += 2
+            elif op in (OP_JUMP, OP_JUMP_IF_FALSE, OP_LOOP):
+                jump = self.read_short(offset + 1)
+                target = offset + 3 + (-jump if op == OP_LOOP else jump)
+                text += f' -> {target}'
+                offset += 3
+            elif op in (OP_CONSTANT, OP_GET_GLOBAL, OP_DEFINE_GLOBAL, OP_SET_GLOBAL):
+                index = self.read_short(offset + 1)
+                text += f' {index} {self.constants[index]!r}'
+                offset += 3
+            elif op == OP_CLOSURE:
+                function = self.constants[self.read_short(offset + 1)]
+                text += f' {function}'
+                offset += 3 + 2 * function.upvalue_count
+            else:
+                offset += 1
+            lines.append(text)
+        return '\n'.join(lines)
+
+    def read_short(self, offset: int) -> int:
+        return (self.code[offset] << 8) | self.code[offset + 1]
+
+
+class LoxVMFunction:
+    def __init__(self, name: str | None, arity: int = 0):
+        self.name = name
+        self.arity = arity
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __str__(self):
+        if self.name is None:
+            return '<script>'
+        return f'<fn {self.name}>'
+
+
+FunctionType = Enum('FunctionType', 'FUNCTION SCRIPT')
+
+
+class Local:
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        # depth 为 -1 表示已声明但还没有初始化
+        self.depth = depth
+        self.is_captured = False
+
+
+class FunctionState:
+    """编译单个函数时的状态, 嵌套函数通过 enclosing 串起来"""
+
+    def __init__(self, enclosing: 'FunctionState | None', function: LoxVMFunction, type_):
+        self.enclosing = enclosing
+        self.function = function
+        self.type = type_
+        # slot 0 留给被调用的函数自身
+        self.locals: List[Local] = [Local('', 0)]
+        self.upvalues: List[tuple[bool, int]] = []
+        self.scope_depth = 0
+
+
+class CompileError(Exception):
+    pass
+
+
+class Compiler(eVisitor, sVisitor):
+    """
+    把 Stmt/Expr 语法树编译成 lox.vm 执行的字节码.
+    局部变量放在 VM 栈上, 被闭包捕获的变量通过 upvalue 访问.
+    """
+
+    def __init__(self):
+        self.current: FunctionState | None = None
+        self.line = 0
+
+    def compile(self, statements: List[Stmt]) -> LoxVMFunction | None:
+        self.current = FunctionState(None, LoxVMFunction(None), FunctionType.SCRIPT)
+        try:
+            self.compile_statements(statements)
+        except CompileError:
+            return None
+        return self.end_function()
+
+    # 生成字节码
+
+    def chunk(self) -> Chunk:
+        return self.current.function.chunk
+
+    def emit(self, *bytes_: int):
+        chunk = self.chunk()
+        for byte in bytes_:
+            chunk.write(byte, self.line)
+
+    def emit_short(self, op: int, operand: int):
+        self.emit(op, (operand >> 8) & 0xFF, operand & 0xFF)
+
+    def emit_jump(self, op: int) -> int:
+        self.emit(op, 0xFF, 0xFF)
+        return len(self.chunk().code) - 2
+
+    def patch_jump(self, offset: int):
+        code = self.chunk().code
+        jump = len(code) - offset - 2
+        if jump > UINT16_MAX:
+            self.error('Too much code to jump over.')
+        code[offset] = (jump >> 8) & 0xFF
+        code[offset + 1] = jump & 0xFF
+
+    def emit_loop(self, loop_start: int):
+        offset = len(self.chunk().code) - loop_start + 3
+        if offset > UINT16_MAX:
+            self.error('Loop body too large.')
+        self.emit_short(OP_LOOP, offset)
+
+    def make_constant(self, value: object) -> int:
+        index = self.chunk().add_constant(value)
+        if index > UINT16_MAX:
+            self.error('Too many constants in one chunk.')
+        return index
+
+    def error(self, message: str):
+        report(self.line, '', message)
+        raise CompileError()
+
+    # 作用域和变量
+
+    def begin_scope(self):
+        self.current.scope_depth += 1
+
+    def end_scope(self):
+        state = self.current
+        state.scope_depth -= 1
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            self.emit(OP_CLOSE_UPVALUE if state.locals[-1].is_captured else OP_POP)
+            state.locals.pop()
+
+    def declare_variable(self, name: Token):
+        if self.current.scope_depth == 0:
+            return
+        if len(self.current.locals) > UINT8_MAX:
+            self.error('Too many local variables in function.')
+        self.current.locals.append(Local(name.lexeme, -1))
+
+    def define_variable(self, name: Token):
+        if self.current.scope_depth > 0:
+            self.current.locals[-1].depth = self.current.scope_depth
+            return
+        self.emit_short(OP_DEFINE_GLOBAL, self.make_constant(name.lexeme))
+
+    def resolve_local(self, state: FunctionState, name: str) -> int:
+        for i in range(len(state.locals) - 1, -1, -1):
+            if state.locals[i].name == name:
+                return i
+        return -1
+
+    def resolve_upvalue(self, state: FunctionState, name: str) -> int:
+        if state.enclosing is None:
+            return -1
+        local = self.resolve_local(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].is_captured = True
+            return self.add_upvalue(state, True, local)
+        upvalue = self.resolve_upvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.add_upvalue(state, False, upvalue)
+        return -1
+
+    def add_upvalue(self, state: FunctionState, is_local: bool, index: int) -> int:
+        upvalue = (is_local, index)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+        if len(state.upvalues) > UINT8_MAX:
+            self.error('Too many closure variables in function.')
+        state.upvalues.append(upvalue)
+        state.function.upvalue_count = len(state.upvalues)
+        return len(state.upvalues) - 1
+
+    def named_variable(self, name: Token, get: bool):
+        self.line = name.line
+        slot = self.resolve_local(self.current, name.lexeme)
+        if slot != -1:
+            self.emit(OP_GET_LOCAL if get else OP_SET_LOCAL, slot)
+            return
+        upvalue = self.resolve_upvalue(self.current, name.lexeme)
+        if upvalue != -1:
+            self.emit(OP_GET_UPVALUE if get else OP_SET_UPVALUE, upvalue)
+            return
+        op = OP_GET_GLOBAL if get else OP_SET_GLOBAL
+        self.emit_short(op, self.make_constant(name.lexeme))
+
+    # 函数
+
+    def end_function(self) -> LoxVMFunction:
+        self.emit(OP_NIL, OP_RETURN)
+        function = self.current.function
+        self.current = self.current.enclosing
+        return function
+
+    def compile_function(self, stmt: Function):
+        function = LoxVMFunction(stmt.name.lexeme, len(stmt.params))
+        self.current = FunctionState(self.current, function, FunctionType.FUNCTION)
+        self.begin_scope()
+        for param in stmt.params:
+            self.declare_variable(param)
+            self.define_variable(param)
+        self.compile_statements(stmt.body)
+        state = self.current
+        self.end_function()
+
+        self.line = stmt.name.line
+        self.emit_short(OP_CLOSURE, self.make_constant(function))
+        for is_local, index in state.upvalues:
+            self.emit(1 if is_local else 0, index)
+
+    # 语句
+
+    def compile_statements(self, statements: List[Stmt]):
+        for statement in statements:
+            self.compile_stmt(statement)
+
+    def compile_stmt(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def compile_expr(self, expr: Expr):
+        expr.accept(self)
+
+    def visitBlockStmt(self, stmt: Block):
+        self.begin_scope()
+        self.compile_statements(stmt.statements)
+        self.end_scope()
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.compile_expr(stmt.expression)
+        self.emit(OP_POP)
+
+    def visitForStmt(self, stmt: For):
+        self.begin_scope()
+        if stmt.initializer is not None:
+            self.compile_stmt(stmt.initializer)
+        loop_start = len(self.chunk().code)
+        exit_jump = None
+        if stmt.condition is not None:
+            self.compile_expr(stmt.condition)
+            exit_jump = self.emit_jump(OP_JUMP_IF_FALSE)
+            self.emit(OP_POP)
+        self.compile_stmt(stmt.body)
+        if stmt.increment is not None:
+            self.compile_expr(stmt.increment)
+            self.emit(OP_POP)
+        self.emit_loop(loop_start)
+        if exit_jump is not None:
+            self.patch_jump(exit_jump)
+            self.emit(OP_POP)
+        self.end_scope()
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.declare_variable(stmt.name)
+        # 局部函数先标记为已初始化, 这样函数体可以递归引用自身
+        if self.current.scope_depth > 0:
+            self.current.locals[-1].depth = self.current.scope_depth
+        self.compile_function(stmt)
+        self.define_variable(stmt.name)
+
+    def visitIfStmt(self, stmt: If):
+        self.compile_expr(stmt.condition)
+        then_jump = self.emit_jump(OP_JUMP_IF_FALSE)
+        self.emit(OP_POP)
+        self.compile_stmt(stmt.thenBranch)
+        else_jump = self.emit_jump(OP_JUMP)
+        self.patch_jump(then_jump)
+        self.emit(OP_POP)
+        if stmt.elseBranch is not None:
+            self.compile_stmt(stmt.elseBranch)
+        self.patch_jump(else_jump)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.compile_expr(stmt.expression)
+        self.emit(OP_PRINT)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value is None:
+            self.line = stmt.keyword.line
+            self.emit(OP_NIL)
+        elif isinstance(stmt.value, Call) and self.current.type == FunctionType.FUNCTION:
+            # 尾调用: 被调用的 Lox 函数复用当前的帧, 尾递归不会让调用栈变深
+            self.call(stmt.value, OP_TAIL_CALL)
+        else:
+            self.compile_expr(stmt.value)
+        self.emit(OP_RETURN)
+
+    def visitVarStmt(self, stmt: Var):
+        self.declare_variable(stmt.name)
+        if stmt.initializer is None:
+            self.emit(OP_NIL)
+        else:
+            self.compile_expr(stmt.initializer)
+        self.line = stmt.name.line
+        self.define_variable(stmt.name)
+
+    def visitWhileStmt(self, stmt: While):
+        loop_start = len(self.chunk().code)
+        self.compile_expr(stmt.condition)
+        exit_jump = self.emit_jump(OP_JUMP_IF_FALSE)
+        self.emit(OP_POP)
+        self.compile_stmt(stmt.body)
+        self.emit_loop(loop_start)
+        self.patch_jump(exit_jump)
+        self.emit(OP_POP)
+
+    # 表达式
+
+    def visitAssignExpr(self, expr: Assign):
+        self.compile_expr(expr.value)
+        self.named_variable(expr.name, False)
+
+    def visitBinaryExpr(self, expr: Binary):
+        self.compile_expr(expr.left)
+        self.compile_expr(expr.right)
+        self.line = expr.operator.line
+        self.emit(_BINARY_OPS[expr.operator.type])
+
+    def visitCallExpr(self, expr: Call):
+        self.call(expr, OP_CALL)
+
+    def call(self, expr: Call, op: int):
+        self.compile_expr(expr.callee)
+        for argument in expr.arguments:
+            self.compile_expr(argument)
+        self.line = expr.paren.line
+        self.emit(op, len(expr.arguments))
+
+    def visitGroupingExpr(self, expr: Grouping):
+        self.compile_expr(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        if expr.value is None:
+            self.emit(OP_NIL)
+        elif expr.value is True:
+            self.emit(OP_TRUE)
+        elif expr.value is False:
+            self.emit(OP_FALSE)
+        else:
+            self.emit_short(OP_CONSTANT, self.make_constant(expr.value))
+
+    def visitLogicalExpr(self, expr: Logical):
+        self.compile_expr(expr.left)
+        self.line = expr.operator.line
+        if expr.operator.type == TokenType.OR:
+            else_jump = self.emit_jump(OP_JUMP_IF_FALSE)
+            end_jump = self.emit_jump(OP_JUMP)
+            self.patch_jump(else_jump)
+            self.emit(OP_POP)
+            self.compile_expr(expr.right)
+            self.patch_jump(end_jump)
+        else:
+            end_jump = self.emit_jump(OP_JUMP_IF_FALSE)
+            self.emit(OP_POP)
+            self.compile_expr(expr.right)
+            self.patch_jump(end_jump)
+
+    def visitUnaryExpr(self, expr: Unary):
+        self.compile_expr(expr.right)
+        self.line = expr.operator.line
+        self.emit(OP_NEGATE if expr.operator.type == TokenType.MINUS else OP_NOT)
+
+    def visitVariableExpr(self, expr: Variable):
+        self.named_variable(expr.name, True)
+
+
+_BINARY_OPS = {
+    TokenType.PLUS: OP_ADD,
+    TokenType.MINUS: OP_SUBTRACT,
+    TokenType.STAR: OP_MULTIPLY,
+    TokenType.SLASH: OP_DIVIDE,
+    TokenType.EQUAL_EQUAL: OP_EQUAL,
+    TokenType.BANG_EQUAL: OP_NOT_EQUAL,
+    TokenType.GREATER: OP_GREATER,
+    TokenType.GREATER_EQUAL: OP_GREATER_EQUAL,
+    TokenType.LESS: OP_LESS,
+    TokenType.LESS_EQUAL: OP_LESS_EQUAL,
+}
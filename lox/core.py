@@ -1,56 +1,319 @@
-import sys
+import argparse
+from typing import List
 
-from lox.error import error, had_error, had_runtime_error, report
+from lox import cache, natives
+from lox.closure_compiler import ClosureInterpreter
+from lox.counters import CountingInterpreter
+from lox.error import Session
 from lox.interpreter import Interpreter
-from lox.parser import Parser
-from lox.scanner import Scanner, Token, TokenType
+from lox.optimizer import Optimizer
+from lox.output import Output, outputs
+from lox.parser import PrattParser, StreamingParser
+from lox.profiler import ProfilingInterpreter, unavailable
+from lox.resolver import Resolver
+from lox.scanner import RegexScanner, Scanner, Token, TokenType
+from lox.stats import Stats, StatsInterpreter
+from lox.Stmt import Stmt
 from lox.tool.ast_printer import AstPrinter
+from lox.transpiler import PythonInterpreter
+from lox.vm import FRAMES_MAX, VM
 
-interpreter = Interpreter()
+# 可选的解析器前端. lark 需要可选的 lark 包, 用到时才导入
+front_ends = ('pratt', 'lark')
 
+# 可选的执行引擎
+engines = {
+    'tree': Interpreter,
+    'closure': ClosureInterpreter,
+    'vm': VM,
+    'python': PythonInterpreter,
+}
 
-def run_file(path: str):
-    with open(path, 'r') as f:
-        data = f.read()
-    run(data)
-    # Indicate an error in the exit code
-    if had_error:
-        exit(65)
-    if had_runtime_error:
-        exit(70)
 
+class Lox:
+    """
+    一个独立的运行环境: 自己的引擎 (保留全局变量, 供 REPL 多次调用 run) 和自己的错误状态.
+    不同的 Lox 可以在同一个进程的多个线程或 asyncio 任务里同时使用.
+    """
 
-def run_prompt():
+    def __init__(
+        self,
+        engine: str = 'tree',
+        interpreter=None,
+        session: Session | None = None,
+        front_end: str = 'pratt',
+        output: Output | None = None,
+    ):
+        self.interpreter = engines[engine]() if interpreter is None else interpreter
+        if output is not None:
+            self.interpreter.output = output
+        self.session = Session() if session is None else session
+        self.session.output = self.interpreter.output
+        self.front_end = front_end
+
+    def run_file(self, path: str, use_cache: bool = True, optimize: bool = True) -> int:
+        """运行脚本, 返回退出码"""
+        with open(path, 'r') as f:
+            data = f.read()
+        with self.session.active():
+            statements = cache.load(path, data, self.front_end) if use_cache else None
+            if statements is None:
+                statements = self.parse(data)
+                if statements is not None and use_cache:
+                    cache.store(path, data, statements, self.front_end)
+            if statements is not None:
+                self.execute(statements, optimize)
+        return self.session.exit_code()
+
+    def run(self, source: str):
+        with self.session.active():
+            statements = self.parse(source)
+            if statements is not None:
+                self.execute(statements)
+
+    def parse(self, source: str) -> List[Stmt] | None:
+        with self.session.active():
+            if self.front_end == 'lark':
+                from lox.lark_parser import LarkParser
+
+                statements = LarkParser(source).parse()
+            else:
+                scanner = RegexScanner(source)
+                parser = StreamingParser(scanner.iter_tokens())
+                statements = parser.parse()
+
+        # Stop if there was a syntax error.
+        if self.session.had_error:
+            return None
+        return statements
+
+    def execute(self, statements: List[Stmt], optimize: bool = True):
+        with self.session.active():
+            resolver = Resolver(self.interpreter)
+            resolver.resolve(statements)
+
+            # Stop if there was a resolution error.
+            if self.session.had_error:
+                return
+
+            if optimize:
+                statements = Optimizer().optimize(statements)
+            self.interpreter.interpret(statements)
+
+
+def run_file(
+    path: str,
+    engine: str = 'tree',
+    use_cache: bool = True,
+    optimize: bool = True,
+    front_end: str = 'pratt',
+    max_depth: int | None = None,
+    output: str = 'stdout',
+):
+    interpreter = VM(max_depth) if max_depth is not None else None
+    lox = Lox(engine, interpreter, front_end=front_end, output=outputs[output]())
+    exit_on_error(lox.run_file(path, use_cache, optimize))
+
+
+def exit_on_error(status: int):
+    if status:
+        exit(status)
+
+
+def run_prompt(
+    engine: str = 'tree',
+    front_end: str = 'pratt',
+    max_depth: int | None = None,
+    output: str = 'stdout',
+):
+    interpreter = VM(max_depth) if max_depth is not None else None
+    lox = Lox(engine, interpreter, front_end=front_end, output=outputs[output]())
     while True:
         line = input('> ')
         if line == '':
             break
-        run(line)
-        global had_error
-        had_error = False
+        lox.run(line)
+        lox.session.had_error = False
 
 
-def run(source: str):
-    scanner = Scanner(source)
-    tokens = scanner.scan_tokens()
-    parser = Parser(tokens)
-    statements = parser.parse()
+def profile(
+    path: str,
+    folded: str,
+    use_cache: bool = True,
+    front_end: str = 'pratt',
+    output: str = 'stdout',
+):
+    profiler = ProfilingInterpreter()
+    lox = Lox(interpreter=profiler, front_end=front_end, output=outputs[output]())
+    try:
+        status = lox.run_file(path, use_cache)
+    finally:
+        # 出错时报告仍然要输出
+        profiler.report()
+        profiler.write_folded(folded)
+    exit_on_error(status)
 
-    if had_error:
-        return
 
-    interpreter.interpret(statements)
+def count(
+    path: str,
+    counts: str,
+    use_cache: bool = True,
+    front_end: str = 'pratt',
+    output: str = 'stdout',
+):
+    counter = CountingInterpreter()
+    lox = Lox(interpreter=counter, front_end=front_end, output=outputs[output]())
+    try:
+        # 统计的是源码里写的语句, 不做常量折叠, 也不剪掉死代码
+        status = lox.run_file(path, use_cache, optimize=False)
+    finally:
+        counter.write_json(counts)
+    exit_on_error(status)
+
+
+def stats(
+    path: str,
+    engine: str = 'tree',
+    memory: bool = False,
+    max_depth: int | None = None,
+    output: str = 'stdout',
+):
+    # 各阶段分开计时, 所以不走缓存, 也不用 StreamingParser. lark 前端边扫描边解析, 分不开阶段
+    report = Stats(memory)
+    if engine == 'tree':
+        interpreter = StatsInterpreter()
+    else:
+        interpreter = VM(max_depth) if max_depth is not None else None
+    lox = Lox(engine, interpreter, output=outputs[output]())
+    try:
+        with open(path, 'r') as f:
+            source = f.read()
+        with lox.session.active():
+            with report.phase('scan'):
+                tokens = RegexScanner(source).scan_tokens()
+            report.counts['tokens'] = len(tokens)
+            with report.phase('parse'):
+                statements = PrattParser(tokens).parse()
+        if not lox.session.had_error:
+            report.count_nodes(statements)
+            with report.phase('execute'):
+                lox.execute(statements)
+            report.count_runtime(lox.interpreter)
+    finally:
+        report.report()
+    exit_on_error(lox.session.exit_code())
+
+
+def positive(text: str) -> int:
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+    return value
 
 
 def main():
-    if len(sys.argv) > 2:
-        print('Usage: plox [scripts]')
-        print(sys.argv)
-        exit(64)
-    elif len(sys.argv) == 2:
-        run_file(sys.argv[1])
+    parser = argparse.ArgumentParser(prog='plox')
+    parser.add_argument('script', nargs='?')
+    parser.add_argument(
+        '--engine', choices=engines, default='tree', help='execution engine (default: tree)'
+    )
+    parser.add_argument(
+        '--vm', dest='engine', action='store_const', const='vm', help='same as --engine vm'
+    )
+    parser.add_argument(
+        '--parser',
+        choices=front_ends,
+        default='pratt',
+        help='parser front end (default: pratt; lark needs the lark package)',
+    )
+    parser.add_argument(
+        '--max-depth',
+        type=positive,
+        metavar='N',
+        help=f'maximum Lox call depth of the vm engine (default: {FRAMES_MAX}); '
+        'the other engines are limited by the Python stack',
+    )
+    parser.add_argument(
+        '--output',
+        choices=outputs,
+        default='stdout',
+        help='where print writes (default: stdout; buffered batches writes, null drops them)',
+    )
+    parser.add_argument(
+        '--no-cache',
+        dest='cache',
+        action='store_false',
+        help=f'do not read or write parsed scripts in {cache.CACHE_DIR}',
+    )
+    parser.add_argument(
+        '--native',
+        action='append',
+        default=[],
+        metavar='MODULE',
+        help='import a Python module that registers natives with lox.natives.native',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='sample the tree engine, print a per-function/per-line table to stderr '
+        'and write collapsed stacks to --profile-out',
+    )
+    parser.add_argument(
+        '--profile-out',
+        default='lox.folded',
+        metavar='FOLDED',
+        help='collapsed stacks file written by --profile (default: lox.folded)',
+    )
+    parser.add_argument(
+        '--counts',
+        metavar='JSON',
+        help='run on the tree engine and write per-line execution counts to JSON',
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='print per-phase wall time and counters to stderr '
+        '(runtime counters need the tree engine)',
+    )
+    parser.add_argument(
+        '--stats-memory',
+        action='store_true',
+        help='like --stats, also trace peak memory per phase (much slower execution)',
+    )
+    args = parser.parse_args()
+    # 在创建引擎之前导入, 引擎创建时会定义所有已注册的原生函数
+    natives.load(*args.native)
+    if args.max_depth is not None and args.engine != 'vm':
+        parser.error('--max-depth needs the vm engine')
+    if args.stats or args.stats_memory:
+        if args.script is None:
+            parser.error('--stats needs a script')
+        if args.parser != 'pratt':
+            parser.error('--stats times scanning and parsing separately and needs --parser pratt')
+        stats(args.script, args.engine, args.stats_memory, args.max_depth, args.output)
+        return
+    if args.profile or args.counts is not None:
+        if args.script is None or args.engine != 'tree':
+            parser.error('--profile and --counts need a script and the tree engine')
+        if args.profile:
+            reason = unavailable()
+            if reason is not None:
+                parser.error(reason)
+            profile(args.script, args.profile_out, args.cache, args.parser, args.output)
+        else:
+            count(args.script, args.counts, args.cache, args.parser, args.output)
+        return
+    if args.script is not None:
+        run_file(
+            args.script,
+            args.engine,
+            args.cache,
+            front_end=args.parser,
+            max_depth=args.max_depth,
+            output=args.output,
+        )
     else:
-        run_prompt()
+        run_prompt(args.engine, args.parser, args.max_depth, args.output)
 
 
 if __name__ == '__main__':
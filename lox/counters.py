@@ -0,0 +1,71 @@
+"""
+按节点和行统计执行次数, 用于 Lox 脚本的覆盖率和找热点循环.
+
+计数只发生在 CountingInterpreter 重写的 evaluate/execute 里, 普通的 Interpreter 不受影响.
+"""
+import json
+from collections import Counter
+from typing import Iterator, List
+
+from lox.Expr import Expr
+from lox.interpreter import Interpreter
+from lox.profiler import line_of
+from lox.Stmt import Stmt
+
+
+class CountingInterpreter(Interpreter):
+    def __init__(self):
+        super().__init__()
+        # 节点 -> 执行次数
+        self.counts: Counter[Expr | Stmt] = Counter()
+        self.statements: List[Stmt] = []
+
+    def interpret(self, statements: List[Stmt]):
+        self.statements.extend(statements)
+        super().interpret(statements)
+
+    def evaluate(self, expr: Expr):
+        self.counts[expr] += 1
+        return self.dispatch[expr.kind](expr)
+
+    def execute(self, stmt: Stmt) -> tuple[object] | None:
+        self.counts[stmt] += 1
+        return self.dispatch[stmt.kind](stmt)
+
+    def lines(self) -> dict[int, dict]:
+        """
+        行号 -> {statements, expressions, nodes}. 没有执行过的语句也会出现, 计数为 0.
+        没有 token 的节点 (字面量, Block) 算在外层节点所在的行.
+        """
+        lines: dict[int, dict] = {}
+        for node, line in walk(self.statements, None):
+            if line is None:
+                continue
+            entry = lines.get(line)
+            if entry is None:
+                entry = lines[line] = {'statements': 0, 'expressions': 0, 'nodes': {}}
+            count = self.counts[node]
+            entry['statements' if isinstance(node, Stmt) else 'expressions'] += count
+            name = type(node).__name__
+            entry['nodes'][name] = entry['nodes'].get(name, 0) + count
+        return dict(sorted(lines.items()))
+
+    def write_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'lines': self.lines()}, f, indent=2)
+            f.write('\n')
+
+
+def walk(nodes: List[Expr | Stmt], line: int | None) -> Iterator[tuple[Expr | Stmt, int | None]]:
+    """按源码顺序列出所有节点和它所在的行, 子节点从生成的 __match_args__ 里找"""
+    for node in nodes:
+        node_line = line_of(node) or line
+        yield node, node_line
+        for field in node.__match_args__:
+            value = getattr(node, field)
+            if isinstance(value, (Expr, Stmt)):
+                yield from walk([value], node_line)
+            elif isinstance(value, list):
+                yield from walk(
+                    [item for item in value if isinstance(item, (Expr, Stmt))], node_line
+                )
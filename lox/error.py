@@ -1,7 +1,7 @@
 import sys
-
-had_error = False
-had_runtime_error = False
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TextIO
 
 
 class LoxRuntimeError(RuntimeError):
@@ -10,18 +10,66 @@ class LoxRuntimeError(RuntimeError):
         self.token = token
 
 
+class Session:
+    """
+    一次运行的错误状态. 扫描器, 解析器和各个引擎通过下面的 error/report/runtime_error 报告错误,
+    记到当前激活的 Session 上. 激活是按 contextvars 记录的, 不同线程和 asyncio 任务互不影响.
+    """
+
+    def __init__(self, stderr: TextIO | None = None):
+        self.had_error = False
+        self.had_runtime_error = False
+        # None 表示写到当时的 sys.stderr, 这样 redirect_stderr 仍然有效
+        self.stderr = stderr
+        # 引擎的 print 输出 (lox.output), 写错误之前先 flush, 保持和 stdout 的先后顺序
+        self.output = None
+
+    @contextmanager
+    def active(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def write(self, message: str):
+        if self.output is not None:
+            self.output.flush()
+        (self.stderr or sys.stderr).write(message)
+
+    def report(self, line: int, where: str, message: str):
+        self.write(f'[line {line}] Error{where}: {message}\n')
+        self.had_error = True
+
+    def runtime_error(self, error: LoxRuntimeError):
+        self.write(f'{error}\n[line {error.token.line}]\n')
+        self.had_runtime_error = True
+
+    def exit_code(self) -> int:
+        # Indicate an error in the exit code
+        if self.had_error:
+            return 65
+        if self.had_runtime_error:
+            return 70
+        return 0
+
+
+_current: ContextVar[Session] = ContextVar('session')
+# 没有激活任何 Session 时 (比如直接使用 Parser 的工具脚本) 用这个
+_default = Session()
+
+
+def current() -> Session:
+    return _current.get(_default)
+
+
 def error(line: int, message: str):
     report(line, '', message)
 
 
 def report(line: int, where: str, message: str):
-    sys.stderr.write(f'[line {line}] Error{where}: {message}\n')
-    global had_error
-    had_error = True
+    current().report(line, where, message)
 
 
 def runtime_error(error: LoxRuntimeError):
-    # sys.stderr.write(str(error) + '\n[line] ' + str(error.token.line) + ']')
-    sys.stderr.write(f'{error}\n[line {error.token.line}]\n')
-    global had_runtime_error
-    had_runtime_error = True
+    current().runtime_error(error)
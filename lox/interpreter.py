@@ -1,58 +1,161 @@
-from abc import ABC, abstractmethod
-from typing import List
+import itertools
+import math
+import operator
+from typing import Callable, List
 
+from lox import natives
 from lox.error import LoxRuntimeError, runtime_error
 from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
 from lox.Expr import Visitor as eVisitor
+from lox.natives import LoxCallable
+from lox.output import StdoutOutput
 from lox.scanner import Token, TokenType
-from lox.Stmt import Block, Expression, Function, If, Print, Stmt, Var
+from lox.Stmt import Block, Expression, For, Function, If, Print, Stmt, Var
 from lox.Stmt import Visitor as sVisitor
 from lox.Stmt import While
 
 
 class Environment:
-    def __init__(self, enclosing=None):
+    """
+    局部作用域, 变量按 Resolver 计算出的 slot 存放在列表中, 查找时不需要哈希变量名.
+    """
+
+    __slots__ = ('enclosing', 'values')
+
+    def __init__(self, enclosing=None, values: list[object] | None = None):
         self.enclosing = enclosing
+        # 函数调用时直接把参数列表当作新环境的前几个 slot
+        self.values: list[object] = [] if values is None else values
+
+    def define(self, value: object):
+        # 声明顺序和 Resolver 分配 slot 的顺序一致
+        self.values.append(value)
+
+    def ancestor(self, distance: int) -> 'Environment':
+        environment = self
+        for _ in range(distance):
+            environment = environment.enclosing
+        return environment
+
+    def get_at(self, distance: int, slot: int):
+        return self.ancestor(distance).values[slot]
+
+    def assign_at(self, distance: int, slot: int, value: object):
+        self.ancestor(distance).values[slot] = value
+
+
+# 所有 GlobalEnvironment 共用的版本号来源, 不同的解释器不会用到相同的版本号
+_versions = itertools.count()
+
+
+class GlobalEnvironment:
+    """
+    全局作用域仍然按变量名查找, 因为全局变量允许在使用之后才定义.
+    每次定义或者给全局变量赋值, version 都会变, Variable 节点上缓存的值随之失效.
+    """
+
+    def __init__(self):
         self.values: dict[str, object] = {}
+        self.version = next(_versions)
 
     def define(self, name: str, value: object):
         self.values[name] = value
+        self.version = next(_versions)
 
     def get(self, name: Token):
         if name.lexeme in self.values:
             return self.values[name.lexeme]
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
         raise LoxRuntimeError(name, f'Undefined variable "{name.lexeme}".')
 
     def assign(self, name: Token, value: object):
         if name.lexeme in self.values:
             self.values[name.lexeme] = value
-            return
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
+            self.version = next(_versions)
             return
         raise LoxRuntimeError(name, f'Undefined variable "{name.lexeme}".')
 
 
+def is_equal(a, b):
+    if a is None and b is None:
+        return True
+    if a is None:
+        return False
+    return a == b
+
+
+def divide(a: float, b: float) -> float:
+    """和 clox 的 double 除法一样, 除以零得到 inf 或 nan, 不是运行时错误"""
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or math.isnan(a):
+            return math.nan
+        # b 是 0.0 或 -0.0, 符号也参与运算
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def is_truthy(obj: object):
+    if obj is None:
+        return False
+    elif isinstance(obj, bool):
+        return bool(obj)
+    return True
+
+
+def stringify(obj: object, convert: Callable[[object], str] = str):
+    """convert 用来转换数字, 布尔值和容器以外的值 (函数等), 各个引擎的函数对象不一样"""
+    if obj is None:
+        return 'nil'
+    if isinstance(obj, float):
+        text = str(obj)
+        if text.endswith('.0'):
+            text = text[: len(text) - 2]
+        return text
+    if isinstance(obj, bool):
+        return 'true' if obj else 'false'
+    # 标准库里的列表和映射
+    if isinstance(obj, list):
+        return '[' + ', '.join(stringify(item, convert) for item in obj) + ']'
+    if isinstance(obj, dict):
+        items = (f'{stringify(k, convert)}: {stringify(v, convert)}' for k, v in obj.items())
+        return '{' + ', '.join(items) + '}'
+    return convert(obj)
+
+
+# Binary 节点连续这么多次看到两个数字后, 换成特化的运算
+SPECIALIZE_AFTER = 8
+
+_FLOAT_OPERATORS = {
+    TokenType.MINUS: operator.sub,
+    TokenType.SLASH: divide,
+    TokenType.STAR: operator.mul,
+    TokenType.PLUS: operator.add,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.EQUAL_EQUAL: operator.eq,
+}
+
+
 class Interpreter(eVisitor, sVisitor):
     def __init__(self):
-        self.globals_ = Environment()
+        self.globals_ = GlobalEnvironment()
         self.environment = self.globals_
+        # Resolver 的结果: 局部变量表达式 -> (depth, slot)
+        self.locals: dict[Expr, tuple[int, int]] = {}
+        # print 语句的输出, 见 lox.output
+        self.output = StdoutOutput()
+        # Expr 和 Stmt 的 kind 是不重叠的连续整数, 合成一张按 kind 下标的表
+        dispatch = self.expr_dispatch() | self.stmt_dispatch()
+        self.dispatch = [dispatch[kind] for kind in sorted(dispatch)]
 
-        import time
-
-        class clock(LoxCallable):
-            def arity(self):
-                return 0
-
-            def call(self, interpreter, arguments):
-                return time.time()
+        for name, function in natives.load().items():
+            self.define_native(name, function)
 
-            def __str__(self):
-                return '<native fn>'
-
-        self.globals_.define('clock', clock)
+    def define_native(self, name: str, function: LoxCallable):
+        self.globals_.define(name, function)
 
     def visitLiteralExpr(self, expr: Literal):
         return expr.value
@@ -78,6 +181,25 @@ class Interpreter(eVisitor, sVisitor):
     def visitBinaryExpr(self, expr: Binary):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
+        specialized = expr.specialized
+        if specialized is not None:
+            # 守卫: 仍然是两个数字时直接算, 不再 match 和检查类型
+            if type(left) is float and type(right) is float:
+                return specialized(left, right)
+            # 类型变了, 退回通用路径, 重新预热
+            expr.specialized = None
+            expr.warmup = None
+        elif type(left) is float and type(right) is float:
+            warmup = (expr.warmup or 0) + 1
+            if warmup >= SPECIALIZE_AFTER:
+                expr.specialized = _FLOAT_OPERATORS[expr.operator.type]
+            expr.warmup = warmup
+        else:
+            # 预热要求连续命中, 中间出现别的类型就从头计数
+            expr.warmup = None
+        return self.binary(expr, left, right)
+
+    def binary(self, expr: Binary, left: object, right: object):
         operator = expr.operator
         match expr.operator.type:
             case TokenType.MINUS:
@@ -85,7 +207,7 @@ class Interpreter(eVisitor, sVisitor):
                 return float(left) - float(right)
             case TokenType.SLASH:
                 self.check_number_operands(operator, left, right)
-                return float(left) / float(right)
+                return divide(float(left), float(right))
             case TokenType.STAR:
                 self.check_number_operands(operator, left, right)
                 return float(left) * float(right)
@@ -117,15 +239,37 @@ class Interpreter(eVisitor, sVisitor):
     def visitCallExpr(self, expr: Call):
         callee = self.evaluate(expr.callee)
         arguments = [self.evaluate(argument) for argument in expr.arguments]
+        if type(callee) is LoxFunction:
+            # 快速路径: 不经过 LoxCallable.call, 省掉一层调用
+            declaration = callee.declaration
+            if len(arguments) != len(declaration.params):
+                raise LoxRuntimeError(
+                    expr.paren,
+                    f'Expected {len(declaration.params)} arguments but got {len(arguments)}.',
+                )
+            try:
+                result = self.execute_block(
+                    declaration.body, Environment(callee.closure, arguments)
+                )
+            except RecursionError:
+                # 递归太深用完了 Python 的栈, 由最内层的调用报告位置. 需要更深的递归时用 vm 引擎
+                raise LoxRuntimeError(expr.paren, 'Stack overflow.') from None
+            return None if result is None else result[0]
         if not isinstance(callee, LoxCallable):
             raise LoxRuntimeError(expr.paren, 'Can only call functions and classes.')
         function = callee
         # 在函数调用之前检查函数参数的数量
         if len(arguments) != function.arity():
             raise LoxRuntimeError(
-                f'Expected {function.arity()} arguments but got{len(arguments)}.'
+                expr.paren, f'Expected {function.arity()} arguments but got {len(arguments)}.'
             )
-        return function.call(self, arguments)
+        try:
+            return function.call(self, arguments)
+        except LoxRuntimeError as e:
+            # 原生函数不知道自己在哪里被调用, 报错的位置由这里补上
+            if e.token is None:
+                e.token = expr.paren
+            raise
 
     def check_number_operands(self, operator: Token, left: object, right: object):
         if isinstance(left, float) and isinstance(right, float):
@@ -134,21 +278,15 @@ class Interpreter(eVisitor, sVisitor):
             raise LoxRuntimeError(operator, 'Operands must be a number.')
 
     def evaluate(self, expr: Expr):
-        return expr.accept(self)
+        return self.dispatch[expr.kind](expr)
 
     def is_equal(self, a, b):
-        if a is None and b is None:
-            return True
-        if a is None:
-            return False
-        return a == b
+        return is_equal(a, b)
 
     def is_truthy(self, obj: object):
-        if obj is None:
-            return False
-        elif isinstance(obj, bool):
-            return bool(obj)
-        return True
+        return is_truthy(obj)
+
+    # 语句执行后返回 None, 遇到 return 时返回 (value,), 由外层的语句逐级传回函数调用处
 
     def interpret(self, statements: [Stmt]):
         try:
@@ -156,21 +294,14 @@ class Interpreter(eVisitor, sVisitor):
                 self.execute(statement)
         except LoxRuntimeError as e:
             runtime_error(e)
+        finally:
+            self.output.flush()
 
-    def execute(self, stmt: Stmt):
-        stmt.accept(self)
+    def execute(self, stmt: Stmt) -> tuple[object] | None:
+        return self.dispatch[stmt.kind](stmt)
 
     def stringify(self, obj: object):
-        if obj is None:
-            return 'nil'
-        if isinstance(obj, float):
-            text = str(obj)
-            if text.endswith('.0'):
-                text = text[: len(text) - 2]
-            return text
-        if isinstance(obj, bool):
-            return 'true' if obj else 'false'
-        return str(obj)
+        return stringify(obj)
 
     def visitExpressionStmt(self, stmt: Expression):
         self.evaluate(stmt.expression)
@@ -178,49 +309,82 @@ class Interpreter(eVisitor, sVisitor):
 
     def visitFunctionStmt(self, stmt: Function):
         function = LoxFunction(stmt, self.environment)
-        self.environment.define(stmt.name.lexeme, function)
+        self.declare(stmt.name, function)
         return None
 
     def visitPrintStmt(self, stmt: Print):
         value = self.evaluate(stmt.expression)
-        print(self.stringify(value))
+        self.output.print(self.stringify(value))
         return None
 
     def visitReturnStmt(self, stmt: 'Return'):
         value = self.evaluate(stmt.value) if stmt.value != None else None
-        raise Return(value)
+        return (value,)
 
     def visitVarStmt(self, stmt: Var):
         value = None if stmt.initializer is None else self.evaluate(stmt.initializer)
-        self.environment.define(stmt.name.lexeme, value)
+        self.declare(stmt.name, value)
         return None
 
+    def declare(self, name: Token, value: object):
+        if self.environment is self.globals_:
+            self.globals_.define(name.lexeme, value)
+        else:
+            self.environment.define(value)
+
+    def resolve(self, expr: Expr, depth: int, slot: int):
+        self.locals[expr] = (depth, slot)
+
     def visitVariableExpr(self, expr: Variable):
-        return self.environment.get(expr.name)
+        # 内联缓存: 全局变量没有变过就直接用上次查到的值, 连 locals 都不用查
+        if expr.cached_version == self.globals_.version:
+            return expr.cached_value
+        location = self.locals.get(expr)
+        if location is None:
+            value = self.globals_.get(expr.name)
+            expr.cached_version = self.globals_.version
+            expr.cached_value = value
+            return value
+        return self.environment.get_at(*location)
 
     def visitAssignExpr(self, expr: Assign):
         value = self.evaluate(expr.value)
-        self.environment.assign(expr.name, value)
+        location = self.locals.get(expr)
+        if location is None:
+            self.globals_.assign(expr.name, value)
+        else:
+            self.environment.assign_at(*location, value)
         return value
 
     def visitBlockStmt(self, stmt: Block):
-        self.execute_block(stmt.statements, Environment(self.environment))
+        if stmt.scoped:
+            return self.execute_block(stmt.statements, Environment(self.environment))
+        # 没有声明变量的块直接在当前环境里执行
+        for statement in stmt.statements:
+            result = self.execute(statement)
+            if result is not None:
+                return result
         return None
 
-    def execute_block(self, statements: List[Stmt], environment: Environment):
+    def execute_block(
+        self, statements: List[Stmt], environment: Environment
+    ) -> tuple[object] | None:
         previous = self.environment
         try:
             self.environment = environment
             for statement in statements:
-                self.execute(statement)
+                result = self.execute(statement)
+                if result is not None:
+                    return result
         finally:
             self.environment = previous
+        return None
 
     def visitIfStmt(self, stmt: If):
         if self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.thenBranch)
+            return self.execute(stmt.thenBranch)
         elif stmt.elseBranch is not None:
-            self.execute(stmt.elseBranch)
+            return self.execute(stmt.elseBranch)
         return None
 
     def visitLogicalExpr(self, expr: Logical):
@@ -232,46 +396,52 @@ class Interpreter(eVisitor, sVisitor):
             return left
         return self.evaluate(expr.right)
 
+    def visitForStmt(self, stmt: For):
+        if not isinstance(stmt.initializer, Var):
+            return self.loop(stmt)
+        # 循环变量所在的环境只在进入循环时创建一次
+        previous = self.environment
+        try:
+            self.environment = Environment(previous)
+            return self.loop(stmt)
+        finally:
+            self.environment = previous
+
+    def loop(self, stmt: For):
+        if stmt.initializer is not None:
+            self.execute(stmt.initializer)
+        condition = stmt.condition
+        increment = stmt.increment
+        body = stmt.body
+        while condition is None or self.is_truthy(self.evaluate(condition)):
+            result = self.execute(body)
+            if result is not None:
+                return result
+            if increment is not None:
+                self.evaluate(increment)
+        return None
+
     def visitWhileStmt(self, stmt: While):
         while self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            result = self.execute(stmt.body)
+            if result is not None:
+                return result
         return None
 
 
-class LoxCallable(ABC):
-    @abstractmethod
-    def call(self, interpreter: Interpreter, arguments: List[object]):
-        pass
-
-    @abstractmethod
-    def arity(self):
-        pass
-
-
 class LoxFunction(LoxCallable):
     def __init__(self, declaration: Function, closure: Environment):
         self.closure = closure
         self.declaration = declaration
 
     def call(self, interpreter: Interpreter, argument: List[object]) -> object:
-        # Important!!! 每次函数调用都要创建新的环境
-        environment = Environment(self.closure)
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, argument[i])
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except Return as return_value:
-            return return_value.value
-        return None
+        # Important!!! 每次函数调用都要创建新的环境, 参数列表就是它的前几个 slot
+        environment = Environment(self.closure, argument)
+        result = interpreter.execute_block(self.declaration.body, environment)
+        return None if result is None else result[0]
 
     def arity(self):
         return len(self.declaration.params)
 
     def __str__(self):
         return f'<fn {self.declaration.name.lexeme}>'
-
-
-class Return(LoxRuntimeError):
-    def __init__(self, value: object):
-        super().__init__(None, None)
-        self.value = value
@@ -0,0 +1,179 @@
+"""
+用 Lark 的 LALR 模式加载 lox.lark 的另一个解析器前端, 生成和 Parser 相同的 Stmt/Expr 树.
+
+转换器在解析的同时执行, 不会先构造完整的 Lark 语法树. 生成的 LALR 表缓存在临时目录里,
+之后的进程不用重新计算. 和手写的 Parser 不同, 遇到语法错误时只报告第一个错误.
+"""
+from functools import cache
+from pathlib import Path
+from typing import List
+
+import lark
+
+from lox.error import report
+from lox.Expr import Assign, Binary, Call, Grouping, Literal, Logical, Unary, Variable
+from lox.parser import error
+from lox.scanner import Token, TokenType
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var, While
+
+GRAMMAR = Path(__file__).resolve().parents[1] / 'lox.lark'
+
+
+class LoxTransformer(lark.Transformer):
+    """把 Lark 的规则和终结符直接映射成 lox.Expr/lox.Stmt 的节点和 lox.scanner.Token"""
+
+    def token(self, token: lark.Token) -> Token:
+        # 具名终结符和 TokenType 同名
+        return Token(TokenType[token.type], str(token), None, token.line)
+
+    # 解析时只会对有同名方法的终结符调用转换
+    IDENTIFIER = RETURN = AND = OR = RIGHT_PAREN = token
+    BANG = BANG_EQUAL = EQUAL = EQUAL_EQUAL = token
+    GREATER = GREATER_EQUAL = LESS = LESS_EQUAL = token
+    MINUS = PLUS = SLASH = STAR = token
+
+    def NUMBER(self, token: lark.Token) -> Token:
+        return Token(TokenType.NUMBER, str(token), float(token), token.line)
+
+    def STRING(self, token: lark.Token) -> Token:
+        # 和扫描器一样, 多行字符串的行号取结束的那一行
+        return Token(TokenType.STRING, str(token), token[1:-1], token.end_line)
+
+    # 语句
+
+    def program(self, children) -> List[Stmt]:
+        return children
+
+    def fun_decl(self, children) -> Stmt:
+        return children[0]
+
+    def function(self, children) -> Stmt:
+        name, parameters, body = children
+        return Function(name, parameters or [], body.statements)
+
+    def parameters(self, children) -> List[Token]:
+        if len(children) > 255:
+            error(children[255], "Can't have more than 255 parameters.")
+        return children
+
+    def var_decl(self, children) -> Stmt:
+        name, initializer = children
+        return Var(name, initializer)
+
+    def return_stmt(self, children) -> Stmt:
+        keyword, value = children
+        return Return(keyword, value)
+
+    def block(self, children) -> Stmt:
+        return Block(children)
+
+    def expr_stmt(self, children) -> Stmt:
+        return Expression(children[0])
+
+    def print_stmt(self, children) -> Stmt:
+        return Print(children[0])
+
+    def if_stmt(self, children) -> Stmt:
+        condition, then_branch, else_branch = children
+        return If(condition, then_branch, else_branch)
+
+    def while_stmt(self, children) -> Stmt:
+        condition, body = children
+        return While(condition, body)
+
+    def for_stmt(self, children) -> Stmt:
+        initializer, condition, increment, body = children
+        return For(initializer, condition, increment, body)
+
+    def for_init(self, children) -> Stmt | None:
+        return children[0] if children else None
+
+    # 表达式
+
+    def assign(self, children):
+        target, equals, value = children
+        if isinstance(target, Variable):
+            return Assign(target.name, value)
+        error(equals, 'Invalid assignment target.')
+        return target
+
+    def binary(self, children):
+        # 同级的运算符是一个扁平的列表, 从左往右结合
+        expr = children[0]
+        for i in range(1, len(children), 2):
+            expr = Binary(expr, children[i], children[i + 1])
+        return expr
+
+    def logical(self, children):
+        expr = children[0]
+        for i in range(1, len(children), 2):
+            expr = Logical(expr, children[i], children[i + 1])
+        return expr
+
+    logic_or = logic_and = logical
+    equality = comparsion = term = factor = binary
+
+    def unary_op(self, children):
+        operator, right = children
+        return Unary(operator, right)
+
+    def call_expr(self, children):
+        callee, arguments, paren = children
+        if arguments is not None and len(arguments) > 255:
+            error(paren, "Can't have more than 255 arguments.")
+        return Call(callee, paren, arguments or [])
+
+    def arguments(self, children):
+        return children
+
+    def true(self, children):
+        return Literal(True)
+
+    def false(self, children):
+        return Literal(False)
+
+    def nil(self, children):
+        return Literal(None)
+
+    def number(self, children):
+        return Literal(children[0].literal)
+
+    def string(self, children):
+        return Literal(children[0].literal)
+
+    def variable(self, children):
+        return Variable(children[0])
+
+    def grouping(self, children):
+        return Grouping(children[0])
+
+
+@cache
+def lark_parser() -> lark.Lark:
+    return lark.Lark(
+        GRAMMAR.read_text(),
+        parser='lalr',
+        transformer=LoxTransformer(),
+        propagate_positions=False,
+        cache=True,
+    )
+
+
+class LarkParser:
+    def __init__(self, source: str):
+        self.source = source
+
+    def parse(self) -> List[Stmt] | None:
+        try:
+            return lark_parser().parse(self.source)
+        except lark.exceptions.UnexpectedCharacters as e:
+            report(e.line, '', 'Unexpected character.')
+        except lark.exceptions.UnexpectedToken as e:
+            token = e.token
+            if token.type == '$END':
+                report(self.source.count('\n') + 1, ' at end', 'Unexpected end of input.')
+            else:
+                report(token.line, f' at {token} ', 'Unexpected token.')
+        except lark.exceptions.UnexpectedEOF:
+            report(self.source.count('\n') + 1, ' at end', 'Unexpected end of input.')
+        return None
@@ -0,0 +1,64 @@
+"""
+原生函数: 用 Python 实现, 以 LoxCallable 的形式暴露给 Lox 程序.
+
+在模块里用 @native(name, arity) 注册函数, 再用 load(module) 导入这个模块.
+每个执行引擎创建时都会通过 define_native 把 load() 返回的函数定义成全局变量.
+原生函数出错时抛出 token 为 None 的 LoxRuntimeError, 由调用处补上位置.
+需要引擎的原生函数 (比如要用引擎的 stringify 显示函数) 注册时加上 interpreter=True,
+调用时第一个参数是当前的引擎.
+"""
+import importlib
+from abc import ABC, abstractmethod
+from typing import Callable, List
+
+STDLIB = 'lox.stdlib'
+
+
+class LoxCallable(ABC):
+    @abstractmethod
+    def call(self, interpreter, arguments: List[object]):
+        pass
+
+    @abstractmethod
+    def arity(self):
+        pass
+
+
+class NativeFunction(LoxCallable):
+    def __init__(self, name: str, params: int, function: Callable, interpreter: bool = False):
+        self.name = name
+        self.params = params
+        self.function = function
+        self.interpreter = interpreter
+
+    def call(self, interpreter, arguments: List[object]) -> object:
+        if self.interpreter:
+            return self.function(interpreter, *arguments)
+        return self.function(*arguments)
+
+    def arity(self):
+        return self.params
+
+    def __str__(self):
+        return '<native fn>'
+
+
+# 全局变量名 -> 原生函数
+registry: dict[str, NativeFunction] = {}
+
+
+def native(name: str, arity: int, interpreter: bool = False):
+    """把 Python 函数注册成名为 name 的 Lox 原生函数"""
+
+    def register(function: Callable) -> Callable:
+        registry[name] = NativeFunction(name, arity, function, interpreter)
+        return function
+
+    return register
+
+
+def load(*modules: str) -> dict[str, NativeFunction]:
+    """导入标准库和给定的模块, 返回目前注册过的所有原生函数"""
+    for module in (STDLIB, *modules):
+        importlib.import_module(module)
+    return registry
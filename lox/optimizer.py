@@ -0,0 +1,204 @@
+from typing import List
+
+from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
+from lox.Expr import Visitor as eVisitor
+from lox.interpreter import is_truthy
+from lox.scanner import TokenType
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var
+from lox.Stmt import Visitor as sVisitor
+from lox.Stmt import While
+
+# 两边都是数字时可以直接算出结果的运算符
+_NUMBER_FOLDS = {
+    TokenType.MINUS: lambda a, b: a - b,
+    TokenType.STAR: lambda a, b: a * b,
+    TokenType.SLASH: lambda a, b: a / b,
+    TokenType.GREATER: lambda a, b: a > b,
+    TokenType.GREATER_EQUAL: lambda a, b: a >= b,
+    TokenType.LESS: lambda a, b: a < b,
+    TokenType.LESS_EQUAL: lambda a, b: a <= b,
+    TokenType.BANG_EQUAL: lambda a, b: a != b,
+    TokenType.EQUAL_EQUAL: lambda a, b: a == b,
+}
+
+# 结果一定是布尔值的运算符, 对它们的结果取两次反等于不做
+_BOOLEAN_OPERATORS = {
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+    TokenType.BANG_EQUAL,
+    TokenType.EQUAL_EQUAL,
+}
+
+
+class Optimizer(eVisitor, sVisitor):
+    """
+    在 Resolver 之后对语法树做常量折叠和化简, 节点原地修改.
+
+    只折叠运行时一定不会出错的表达式, 像 1 - "a" 这样的错误留到运行时在原来的行报告.
+    Variable 和 Assign 节点不会被替换, Resolver 记下的 (depth, slot) 仍然有效;
+    被剪掉的 If/While 分支本身就是独立的作用域, 也不会影响其他变量的 slot.
+    For 即使条件恒为假也保留下来, 初始化语句仍然要执行, 它声明的循环变量也有自己的作用域.
+    """
+
+    def optimize(self, statements: List[Stmt]) -> List[Stmt]:
+        optimized = []
+        for statement in statements:
+            statement = self.optimize_stmt(statement)
+            if statement is not None:
+                optimized.append(statement)
+        return optimized
+
+    def optimize_stmt(self, stmt: Stmt) -> Stmt | None:
+        """返回化简后的语句, 整条语句可以删掉时返回 None"""
+        return stmt.accept(self)
+
+    def optimize_body(self, stmt: Stmt) -> Stmt:
+        # if/while 的分支不能为空, 用空 Block 代替
+        stmt = self.optimize_stmt(stmt)
+        return Block([]) if stmt is None else stmt
+
+    def fold(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    def visitBlockStmt(self, stmt: Block):
+        stmt.statements = self.optimize(stmt.statements)
+        return stmt
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression = self.fold(stmt.expression)
+        if isinstance(stmt.expression, Literal):
+            return None
+        return stmt
+
+    def visitForStmt(self, stmt: For):
+        if stmt.initializer is not None:
+            stmt.initializer = self.optimize_stmt(stmt.initializer)
+        if stmt.condition is not None:
+            stmt.condition = self.fold(stmt.condition)
+            if isinstance(stmt.condition, Literal):
+                if not is_truthy(stmt.condition.value):
+                    stmt.increment = None
+                    stmt.body = Block([])
+                    return stmt
+                # 条件恒为真, 每次迭代不用再求值
+                stmt.condition = None
+        if stmt.increment is not None:
+            stmt.increment = self.fold(stmt.increment)
+        stmt.body = self.optimize_body(stmt.body)
+        return stmt
+
+    def visitFunctionStmt(self, stmt: Function):
+        stmt.body = self.optimize(stmt.body)
+        return stmt
+
+    def visitIfStmt(self, stmt: If):
+        stmt.condition = self.fold(stmt.condition)
+        if isinstance(stmt.condition, Literal):
+            if is_truthy(stmt.condition.value):
+                return self.optimize_stmt(stmt.thenBranch)
+            if stmt.elseBranch is None:
+                return None
+            return self.optimize_stmt(stmt.elseBranch)
+        stmt.thenBranch = self.optimize_body(stmt.thenBranch)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch = self.optimize_stmt(stmt.elseBranch)
+        return stmt
+
+    def visitPrintStmt(self, stmt: Print):
+        stmt.expression = self.fold(stmt.expression)
+        return stmt
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value is not None:
+            stmt.value = self.fold(stmt.value)
+        return stmt
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer is not None:
+            stmt.initializer = self.fold(stmt.initializer)
+        return stmt
+
+    def visitWhileStmt(self, stmt: While):
+        stmt.condition = self.fold(stmt.condition)
+        if isinstance(stmt.condition, Literal) and not is_truthy(stmt.condition.value):
+            return None
+        stmt.body = self.optimize_body(stmt.body)
+        return stmt
+
+    def visitLiteralExpr(self, expr: Literal):
+        return expr
+
+    def visitGroupingExpr(self, expr: Grouping):
+        # 括号只影响解析时的结合顺序, 树建好以后就没有用了
+        return self.fold(expr.expression)
+
+    def visitVariableExpr(self, expr: Variable):
+        return expr
+
+    def visitAssignExpr(self, expr: Assign):
+        expr.value = self.fold(expr.value)
+        return expr
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right = right = self.fold(expr.right)
+        match expr.operator.type:
+            case TokenType.MINUS:
+                if isinstance(right, Literal) and type(right.value) is float:
+                    return Literal(-right.value)
+            case TokenType.BANG:
+                if isinstance(right, Literal):
+                    return Literal(not is_truthy(right.value))
+                # !!x 等于 x, 前提是 x 本身就是布尔值
+                if (
+                    isinstance(right, Unary)
+                    and right.operator.type == TokenType.BANG
+                    and is_boolean(right.right)
+                ):
+                    return right.right
+        return expr
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left = left = self.fold(expr.left)
+        expr.right = right = self.fold(expr.right)
+        if not (isinstance(left, Literal) and isinstance(right, Literal)):
+            return expr
+        a = left.value
+        b = right.value
+        operator = expr.operator.type
+        if operator == TokenType.PLUS:
+            if type(a) is type(b) and type(a) in (float, str):
+                return Literal(a + b)
+            return expr
+        if type(a) is not float or type(b) is not float:
+            return expr
+        if operator == TokenType.SLASH and b == 0:
+            # 结果是 inf 或 nan, 它们不能写成字面量 (python 引擎会生成 inf 这样的名字), 留到运行时再算
+            return expr
+        return Literal(_NUMBER_FOLDS[operator](a, b))
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left = left = self.fold(expr.left)
+        expr.right = self.fold(expr.right)
+        if not isinstance(left, Literal):
+            return expr
+        # 左边是常量时 or/and 的结果在编译期就能确定取哪一边
+        if is_truthy(left.value) == (expr.operator.type == TokenType.OR):
+            return left
+        return expr.right
+
+    def visitCallExpr(self, expr: Call):
+        expr.callee = self.fold(expr.callee)
+        expr.arguments = [self.fold(argument) for argument in expr.arguments]
+        return expr
+
+
+def is_boolean(expr: Expr) -> bool:
+    if isinstance(expr, Literal):
+        return type(expr.value) is bool
+    if isinstance(expr, Unary):
+        return expr.operator.type == TokenType.BANG
+    if isinstance(expr, Binary):
+        return expr.operator.type in _BOOLEAN_OPERATORS
+    return False
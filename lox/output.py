@@ -0,0 +1,89 @@
+"""
+print 语句的输出目标. 各个引擎把 stringify 之后的一行交给 output.print, 运行结束时调用 flush.
+
+缓冲的输出在报告错误之前也要先 flush, 否则 stdout 和 stderr 的顺序会乱.
+这一点由 Session 负责: Lox 把引擎的 output 交给 Session, Session 写 stderr 之前先 flush 它.
+"""
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import List, TextIO
+
+
+class Output(ABC):
+    @abstractmethod
+    def print(self, text: str):
+        pass
+
+    def flush(self):
+        pass
+
+
+class StdoutOutput(Output):
+    """默认的输出, 和 print() 一样每行直接写到当时的 sys.stdout, 这样 redirect_stdout 仍然有效"""
+
+    def print(self, text: str):
+        sys.stdout.write(text + '\n')
+
+    def flush(self):
+        sys.stdout.flush()
+
+
+class BufferedOutput(Output):
+    """
+    攒够 size 个字符, 或者距离上次写出超过 interval 秒时, 再一次性写到 stream.
+    时间只在 print 时检查, 长时间没有输出的计算不会触发写出.
+    """
+
+    def __init__(self, stream: TextIO | None = None, size: int = 64 * 1024, interval: float = 0.1):
+        # None 表示写到当时的 sys.stdout
+        self.stream = stream
+        self.size = size
+        self.interval = interval
+        self.lines: List[str] = []
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def print(self, text: str):
+        self.lines.append(text)
+        self.pending += len(text) + 1
+        if self.pending >= self.size or time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        stream = self.stream or sys.stdout
+        if self.lines:
+            self.lines.append('')
+            stream.write('\n'.join(self.lines))
+            self.lines.clear()
+            self.pending = 0
+        stream.flush()
+        self.last_flush = time.monotonic()
+
+
+class CaptureOutput(Output):
+    """把输出留在内存里, 给嵌入 Lox 的程序和测试用"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def print(self, text: str):
+        self.lines.append(text)
+
+    def getvalue(self) -> str:
+        return ''.join(line + '\n' for line in self.lines)
+
+
+class NullOutput(Output):
+    """丢掉所有输出, 基准测试时只测执行本身"""
+
+    def print(self, text: str):
+        pass
+
+
+# 命令行 --output 的选项
+outputs = {
+    'stdout': StdoutOutput,
+    'buffered': BufferedOutput,
+    'null': NullOutput,
+}
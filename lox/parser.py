@@ -1,7 +1,10 @@
+from enum import IntEnum
+from typing import Iterator
+
 from lox.error import report
 from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
 from lox.scanner import Token, TokenType
-from lox.Stmt import Block, Expression, Function, If, Print, Return, Stmt, Var, While
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var, While
 
 
 class Parser:
@@ -228,18 +231,8 @@ class Parser:
         self.consume(TokenType.RIGHT_PAREN, "Expect ')' for clauses.")
         body = self.statement()
 
-        if increment is not None:
-            body = Block([body, increment])
-
-        if condition is None:
-            condition = Literal(True)
-
-        body = While(condition, body)
-
-        if initializer is not None:
-            body = Block([initializer, body])
-
-        return body
+        # 不再脱糖成 While 和 Block, 省掉每次迭代创建的环境; condition 为 None 表示无限循环
+        return For(initializer, condition, increment, body)
 
     def while_statement(self):
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
@@ -299,6 +292,137 @@ class Parser:
         return statements
 
 
+# 从低到高, Pratt 解析器只继续处理不低于当前优先级的中缀运算符
+Precedence = IntEnum(
+    'Precedence', 'NONE ASSIGNMENT OR AND EQUALITY COMPARISON TERM FACTOR UNARY CALL PRIMARY'
+)
+
+
+class PrattParser(Parser):
+    """
+    表驱动的 Pratt 解析器, 生成和 Parser 完全相同的 Expr 树, 语句部分沿用 Parser.
+    Parser 解析一个字面量要从 assignment 一路调用到 primary, 这里只需要一次 parse_precedence,
+    每层括号也只多两层 Python 调用, 能解析嵌套更深的表达式.
+    """
+
+    def expression(self) -> Expr:
+        return self.parse_precedence(Precedence.ASSIGNMENT)
+
+    def parse_precedence(self, precedence: Precedence) -> Expr:
+        token = self.peek()
+        prefix = PREFIX.get(token.type)
+        if prefix is None:
+            raise self.error(token, 'Expect epxression.')
+        self.advance()
+        expr = prefix(self, token)
+        while True:
+            token = self.peek()
+            rule = INFIX.get(token.type)
+            if rule is None or rule[0] < precedence:
+                return expr
+            self.advance()
+            expr = rule[1](self, expr, token, rule[0])
+
+    # 前缀: 参数是已经消耗掉的第一个 token
+
+    def literal(self, token: Token) -> Expr:
+        match token.type:
+            case TokenType.FALSE:
+                return Literal(False)
+            case TokenType.TRUE:
+                return Literal(True)
+            case TokenType.NIL:
+                return Literal(None)
+        return Literal(token.literal)
+
+    def variable(self, token: Token) -> Expr:
+        return Variable(token)
+
+    def grouping(self, token: Token) -> Expr:
+        expr = self.expression()
+        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+        return Grouping(expr)
+
+    def unary_(self, operator: Token) -> Expr:
+        return Unary(operator, self.parse_precedence(Precedence.UNARY))
+
+    # 中缀: 参数是左操作数, 已经消耗掉的运算符和运算符的优先级
+
+    def binary(self, left: Expr, operator: Token, precedence: Precedence) -> Expr:
+        # 右操作数只取更高优先级的部分, 所以同级的运算符左结合
+        return Binary(left, operator, self.parse_precedence(precedence + 1))
+
+    def logical(self, left: Expr, operator: Token, precedence: Precedence) -> Expr:
+        return Logical(left, operator, self.parse_precedence(precedence + 1))
+
+    def call_(self, callee: Expr, paren: Token, precedence: Precedence) -> Expr:
+        return self.finish_call(callee)
+
+    def assign(self, target: Expr, equals: Token, precedence: Precedence) -> Expr:
+        # 右结合, 和 Parser.assignment 一样先解析右边再检查赋值目标
+        value = self.parse_precedence(Precedence.ASSIGNMENT)
+        if isinstance(target, Variable):
+            return Assign(target.name, value)
+        error(equals, 'Invalid assignment target.')
+        return target
+
+
+PREFIX = {
+    TokenType.FALSE: PrattParser.literal,
+    TokenType.TRUE: PrattParser.literal,
+    TokenType.NIL: PrattParser.literal,
+    TokenType.NUMBER: PrattParser.literal,
+    TokenType.STRING: PrattParser.literal,
+    TokenType.IDENTIFIER: PrattParser.variable,
+    TokenType.LEFT_PAREN: PrattParser.grouping,
+    TokenType.BANG: PrattParser.unary_,
+    TokenType.MINUS: PrattParser.unary_,
+}
+
+# token 类型 -> (优先级, 解析函数)
+INFIX = {
+    TokenType.EQUAL: (Precedence.ASSIGNMENT, PrattParser.assign),
+    TokenType.OR: (Precedence.OR, PrattParser.logical),
+    TokenType.AND: (Precedence.AND, PrattParser.logical),
+    TokenType.BANG_EQUAL: (Precedence.EQUALITY, PrattParser.binary),
+    TokenType.EQUAL_EQUAL: (Precedence.EQUALITY, PrattParser.binary),
+    TokenType.GREATER: (Precedence.COMPARISON, PrattParser.binary),
+    TokenType.GREATER_EQUAL: (Precedence.COMPARISON, PrattParser.binary),
+    TokenType.LESS: (Precedence.COMPARISON, PrattParser.binary),
+    TokenType.LESS_EQUAL: (Precedence.COMPARISON, PrattParser.binary),
+    TokenType.MINUS: (Precedence.TERM, PrattParser.binary),
+    TokenType.PLUS: (Precedence.TERM, PrattParser.binary),
+    TokenType.SLASH: (Precedence.FACTOR, PrattParser.binary),
+    TokenType.STAR: (Precedence.FACTOR, PrattParser.binary),
+    TokenType.LEFT_PAREN: (Precedence.CALL, PrattParser.call_),
+}
+
+
+class StreamingParser(PrattParser):
+    """
+    从 token 迭代器中按需取 token 的 Parser. 语法只需要向前看一个 token,
+    所以只保留当前和上一个 token, 内存占用和源码长度无关, 并且扫描和解析可以交替进行.
+    """
+
+    def __init__(self, tokens: Iterator[Token]):
+        super().__init__([])
+        self.stream = iter(tokens)
+        self.previous_token: Token | None = None
+        self.current_token: Token = next(self.stream)
+
+    def advance(self):
+        if not self.is_at_end():
+            self.previous_token = self.current_token
+            self.current_token = next(self.stream)
+        return self.previous_token
+
+    def peek(self):
+        return self.current_token
+
+    def previous(self):
+        return self.previous_token
+
+
 def error(token: Token, message: str):
     if token.type == TokenType.EOF:
         report(token.line, ' at end', message)
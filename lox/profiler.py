@@ -0,0 +1,147 @@
+"""
+Lox 程序的采样分析器.
+
+ProfilingInterpreter 在执行期间用 SIGALRM 定时采样: 信号处理函数沿着 Python 的调用栈往外找,
+execute_block 的栈帧对应 Lox 的函数调用, evaluate/execute 栈帧里的节点给出当前的行号.
+解释器本身不做任何额外检查, 只有函数调用次数是在 execute_block 里计数的.
+setitimer 只有 Unix 上有, 信号处理函数也只能在主线程里设置.
+"""
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, TextIO
+
+from lox.Expr import Assign, Binary, Call, Grouping, Logical, Unary, Variable
+from lox.interpreter import Environment, Interpreter
+from lox.Stmt import Expression, For, Function, If, Print, Return, Stmt, Var, While
+
+# 采样间隔, 秒
+INTERVAL = 0.001
+SCRIPT = '<script>'
+
+
+def unavailable() -> str | None:
+    """当前环境不能采样时返回原因"""
+    if not hasattr(signal, 'setitimer'):
+        return f'profiling needs signal.setitimer, which is not available on {sys.platform}'
+    if threading.current_thread() is not threading.main_thread():
+        return 'profiling needs to run in the main thread'
+    return None
+
+
+def line_of(node) -> int | None:
+    """节点在源码中的行号, 字面量和 Block 这类没有 token 的节点返回 None"""
+    match node:
+        case Assign() | Variable() | Var() | Function():
+            return node.name.line
+        case Binary() | Logical() | Unary():
+            return node.operator.line
+        case Call():
+            return node.paren.line
+        case Return():
+            return node.keyword.line
+        case Grouping() | Expression() | Print():
+            return line_of(node.expression)
+        case If() | While():
+            return line_of(node.condition)
+        case For():
+            return line_of(node.condition) or line_of(node.initializer) or line_of(node.increment)
+    return None
+
+
+class ProfilingInterpreter(Interpreter):
+    def __init__(self, interval: float = INTERVAL):
+        super().__init__()
+        self.interval = interval
+        # 函数体 (语句列表) 的 id -> 函数名, 用来认出哪些 execute_block 是函数调用
+        self.bodies: dict[int, str] = {}
+        self.calls: Counter[str] = Counter()
+        # 调用栈 (由外到内的 "函数:行号") -> 采样次数
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.elapsed = 0.0
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.bodies[id(stmt.body)] = stmt.name.lexeme
+        return super().visitFunctionStmt(stmt)
+
+    def execute_block(self, statements: List[Stmt], environment: Environment):
+        function = self.bodies.get(id(statements))
+        if function is not None:
+            self.calls[function] += 1
+        return super().execute_block(statements, environment)
+
+    def interpret(self, statements: List[Stmt]):
+        reason = unavailable()
+        if reason is not None:
+            raise RuntimeError(reason)
+        previous = signal.signal(signal.SIGALRM, self.sample)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        start = time.perf_counter()
+        try:
+            super().interpret(statements)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+            self.elapsed += time.perf_counter() - start
+
+    def sample(self, signum, frame):
+        stack = []
+        line = None
+        while frame is not None:
+            code = frame.f_code
+            if code is _EXECUTE_BLOCK:
+                function = frame.f_locals.get('function')
+                if function is not None:
+                    stack.append(f'{function}:{line or "?"}')
+                    line = None
+            elif line is None and code in _NODE_CODES:
+                line = line_of(frame.f_locals.get(_NODE_CODES[code]))
+            frame = frame.f_back
+        stack.append(f'{SCRIPT}:{line or "?"}')
+        self.stacks[tuple(reversed(stack))] += 1
+
+    def write_folded(self, path: str):
+        """每行一个调用栈, 格式是 flamegraph.pl/speedscope 都能读的 collapsed stack"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{";".join(stack)} {count}\n')
+
+    def report(self, out: TextIO = sys.stderr):
+        total = sum(self.stacks.values())
+        if total == 0:
+            out.write('profile: no samples\n')
+            return
+        # 每个样本代表的墙上时间
+        unit = self.elapsed / total * 1000
+
+        own: Counter[str] = Counter()
+        inclusive: Counter[str] = Counter()
+        lines: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            leaf = stack[-1]
+            own[leaf.rsplit(':', 1)[0]] += count
+            lines[leaf] += count
+            for function in {frame.rsplit(':', 1)[0] for frame in stack}:
+                inclusive[function] += count
+
+        out.write(f'profile: {total} samples, {self.elapsed:.3f}s\n\n')
+        out.write(f'{"function":<24}{"calls":>10}{"self ms":>12}{"total ms":>12}{"self %":>9}\n')
+        functions = sorted(inclusive, key=lambda function: (-own[function], -inclusive[function]))
+        for function in functions:
+            out.write(
+                f'{function:<24}{self.calls[function]:>10}{own[function] * unit:>12.1f}'
+                f'{inclusive[function] * unit:>12.1f}{own[function] / total:>9.1%}\n'
+            )
+        out.write(f'\n{"line":<24}{"self ms":>12}{"self %":>9}\n')
+        for frame, count in lines.most_common(20):
+            out.write(f'{frame:<24}{count * unit:>12.1f}{count / total:>9.1%}\n')
+
+
+_EXECUTE_BLOCK = ProfilingInterpreter.execute_block.__code__
+# 栈帧的代码 -> 存放当前节点的局部变量名
+_NODE_CODES = {
+    Interpreter.evaluate.__code__: 'expr',
+    Interpreter.execute.__code__: 'stmt',
+}
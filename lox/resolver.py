@@ -0,0 +1,167 @@
+from enum import Enum
+from typing import List
+
+from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
+from lox.Expr import Visitor as eVisitor
+from lox.parser import error
+from lox.scanner import Token
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var
+from lox.Stmt import Visitor as sVisitor
+from lox.Stmt import While
+
+FunctionType = Enum('FunctionType', 'NONE FUNCTION')
+
+
+def declares(statements: List[Stmt]) -> bool:
+    """语句列表是否直接声明了变量或函数, 没有声明的块不需要自己的作用域"""
+    return any(isinstance(statement, (Var, Function)) for statement in statements)
+
+
+class Resolver(eVisitor, sVisitor):
+    """
+    在解析和执行之间做一次静态分析, 为每个局部变量计算 (depth, slot):
+    depth 是从当前作用域向外跳过的环境数, slot 是变量在该环境中的下标.
+    没有被解析到的变量都当作全局变量处理.
+    """
+
+    def __init__(self, interpreter: 'Interpreter'):
+        self.interpreter = interpreter
+        # 每个作用域记录 name -> [是否已定义, slot], slot 即声明顺序
+        self.scopes: List[dict[str, list]] = []
+        self.current_function = FunctionType.NONE
+
+    def resolve(self, statements: List[Stmt]):
+        for statement in statements:
+            self.resolve_node(statement)
+
+    def resolve_node(self, node: Stmt | Expr):
+        node.accept(self)
+
+    def begin_scope(self):
+        self.scopes.append({})
+
+    def end_scope(self):
+        self.scopes.pop()
+
+    def declare(self, name: Token):
+        if not self.scopes:
+            return
+        scope = self.scopes[-1]
+        if name.lexeme in scope:
+            error(name, 'Already a variable with this name in this scope.')
+            return
+        scope[name.lexeme] = [False, len(scope)]
+
+    def define(self, name: Token):
+        if not self.scopes:
+            return
+        self.scopes[-1][name.lexeme][0] = True
+
+    def resolve_local(self, expr: Expr, name: Token):
+        for depth, scope in enumerate(reversed(self.scopes)):
+            if name.lexeme in scope:
+                self.interpreter.resolve(expr, depth, scope[name.lexeme][1])
+                return
+
+    def resolve_function(self, function: Function, type_: FunctionType):
+        enclosing_function = self.current_function
+        self.current_function = type_
+        self.begin_scope()
+        for param in function.params:
+            self.declare(param)
+            self.define(param)
+        self.resolve(function.body)
+        self.end_scope()
+        self.current_function = enclosing_function
+
+    def visitBlockStmt(self, stmt: Block):
+        # 各个引擎按 scoped 决定是否为这个块创建环境, 这里的作用域必须和它一致
+        stmt.scoped = declares(stmt.statements)
+        if not stmt.scoped:
+            self.resolve(stmt.statements)
+            return
+        self.begin_scope()
+        self.resolve(stmt.statements)
+        self.end_scope()
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.resolve_node(stmt.expression)
+
+    def visitForStmt(self, stmt: For):
+        # 只有 var 声明的循环变量需要作用域, 整个循环共用一个
+        scoped = isinstance(stmt.initializer, Var)
+        if scoped:
+            self.begin_scope()
+        if stmt.initializer is not None:
+            self.resolve_node(stmt.initializer)
+        if stmt.condition is not None:
+            self.resolve_node(stmt.condition)
+        if stmt.increment is not None:
+            self.resolve_node(stmt.increment)
+        self.resolve_node(stmt.body)
+        if scoped:
+            self.end_scope()
+
+    def visitFunctionStmt(self, stmt: Function):
+        # 先定义函数名, 这样函数体内可以递归引用自身
+        self.declare(stmt.name)
+        self.define(stmt.name)
+        self.resolve_function(stmt, FunctionType.FUNCTION)
+
+    def visitIfStmt(self, stmt: If):
+        self.resolve_node(stmt.condition)
+        self.resolve_node(stmt.thenBranch)
+        if stmt.elseBranch is not None:
+            self.resolve_node(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Print):
+        self.resolve_node(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return):
+        if self.current_function == FunctionType.NONE:
+            error(stmt.keyword, "Can't return from top-level code.")
+        if stmt.value is not None:
+            self.resolve_node(stmt.value)
+
+    def visitVarStmt(self, stmt: Var):
+        self.declare(stmt.name)
+        if stmt.initializer is not None:
+            self.resolve_node(stmt.initializer)
+        self.define(stmt.name)
+
+    def visitWhileStmt(self, stmt: While):
+        self.resolve_node(stmt.condition)
+        self.resolve_node(stmt.body)
+
+    def visitAssignExpr(self, expr: Assign):
+        self.resolve_node(expr.value)
+        self.resolve_local(expr, expr.name)
+
+    def visitBinaryExpr(self, expr: Binary):
+        self.resolve_node(expr.left)
+        self.resolve_node(expr.right)
+
+    def visitCallExpr(self, expr: Call):
+        self.resolve_node(expr.callee)
+        for argument in expr.arguments:
+            self.resolve_node(argument)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        self.resolve_node(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitLogicalExpr(self, expr: Logical):
+        self.resolve_node(expr.left)
+        self.resolve_node(expr.right)
+
+    def visitUnaryExpr(self, expr: Unary):
+        self.resolve_node(expr.right)
+
+    def visitVariableExpr(self, expr: Variable):
+        if self.scopes:
+            declared = self.scopes[-1].get(expr.name.lexeme)
+            if declared is not None and not declared[0]:
+                error(expr.name, "Can't read local variable in its own initializer.")
+        self.resolve_local(expr, expr.name)
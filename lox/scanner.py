@@ -1,5 +1,11 @@
+import re
+import sys
+from array import array
 from dataclasses import dataclass
 from enum import Enum, auto
+from typing import Iterator
+
+from lox.error import error
 
 TokenType = Enum(
     'TokenType',
@@ -13,7 +19,7 @@ TokenType = Enum(
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class Token:
     type: TokenType
     lexeme: str
@@ -60,6 +66,17 @@ class Scanner:
         self.tokens.append(Token(TokenType.EOF, '', None, self.line))
         return self.tokens
 
+    def iter_tokens(self) -> Iterator[Token]:
+        """逐个产生 token, 不在 self.tokens 中保留整个列表"""
+        tokens = self.tokens
+        while not self.is_at_end():
+            self.start = self.current
+            self.scan_token()
+            if tokens:
+                yield from tokens
+                tokens.clear()
+        yield Token(TokenType.EOF, '', None, self.line)
+
     def is_at_end(self):
         return self.current >= len(self.source)
 
@@ -96,7 +113,7 @@ class Scanner:
                 self.add_token(TokenType.GREATER_EQUAL if self.match('=') else TokenType.GREATER)
             case '/':
                 if self.match('/'):
-                    while self.peek() != '\n' and self.is_at_end():
+                    while self.peek() != '\n' and not self.is_at_end():
                         self.advance()
                 else:
                     self.add_token(TokenType.SLASH)
@@ -117,9 +134,10 @@ class Scanner:
     def identifier(self):
         while self.is_alhpa_numberic(self.peek()):
             self.advance()
-        text = self.source[self.start : self.current]
+        # 同名标识符共用一个字符串对象
+        text = sys.intern(self.source[self.start : self.current])
         type_ = self.keywords.get(text, TokenType.IDENTIFIER)
-        self.add_token(type_)
+        self.tokens.append(Token(type_, text, None, self.line))
 
     def is_alpha(self, c: str) -> bool:
         return 'a' <= c <= 'z' or 'A' <= c <= 'Z' or c == '_'
@@ -143,7 +161,7 @@ class Scanner:
         self.add_token(TokenType.NUMBER, float(self.source[self.start : self.current]))
 
     def peek_next(self):
-        if self.current + 1 > len(self.source):
+        if self.current + 1 >= len(self.source):
             return '\0'
         return self.source[self.current + 1]
 
@@ -181,3 +199,194 @@ class Scanner:
     def add_token(self, token_type: TokenType, literal: object = None):
         text = self.source[self.start : self.current]
         self.tokens.append(Token(token_type, text, literal, self.line))
+
+
+# 一次匹配一个词素 (连同它前面的空白), 匹配到的分组决定词素的种类
+TOKEN_PATTERN = re.compile(
+    r"""
+    [ \t\r]*
+    (?:
+        (?P<IDENTIFIER>[A-Za-z_][A-Za-z0-9_]*)
+        | (?P<OPERATOR>[!=<>]=?|[(){},.\-+;*]|/(?!/))
+        | (?P<NUMBER>[0-9]+(?:\.[0-9]+)?)
+        | (?P<NEWLINE>\n)
+        | (?P<COMMENT>//[^\n]*)
+        | (?P<STRING>"[^"]*")
+        | (?P<UNTERMINATED>"[^"]*)
+        | (?P<UNEXPECTED>[^ \t\r\n])
+    )
+    """,
+    re.VERBOSE,
+)
+(
+    IDENTIFIER_GROUP,
+    OPERATOR_GROUP,
+    NUMBER_GROUP,
+    NEWLINE_GROUP,
+    COMMENT_GROUP,
+    STRING_GROUP,
+    UNTERMINATED_GROUP,
+    UNEXPECTED_GROUP,
+) = range(1, 9)
+
+OPERATORS = {
+    '(': TokenType.LEFT_PAREN,
+    ')': TokenType.RIGHT_PAREN,
+    '{': TokenType.LEFT_BRACE,
+    '}': TokenType.RIGHT_BRACE,
+    ',': TokenType.COMMA,
+    '.': TokenType.DOT,
+    '-': TokenType.MINUS,
+    '+': TokenType.PLUS,
+    ';': TokenType.SEMICOLON,
+    '/': TokenType.SLASH,
+    '*': TokenType.STAR,
+    '!': TokenType.BANG,
+    '!=': TokenType.BANG_EQUAL,
+    '=': TokenType.EQUAL,
+    '==': TokenType.EQUAL_EQUAL,
+    '>': TokenType.GREATER,
+    '>=': TokenType.GREATER_EQUAL,
+    '<': TokenType.LESS,
+    '<=': TokenType.LESS_EQUAL,
+}
+
+
+class RegexScanner(Scanner):
+    """
+    和 Scanner 产生完全相同的 token, 但用一个编译好的正则表达式成批地切分源码,
+    不再逐个字符调用 advance/peek/match.
+    """
+
+    def scan_tokens(self):
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self) -> Iterator[Token]:
+        intern = sys.intern
+        keywords = self.keywords
+        identifier = TokenType.IDENTIFIER
+        number = TokenType.NUMBER
+        line = self.line
+
+        for match in TOKEN_PATTERN.finditer(self.source):
+            group = match.lastindex
+            if group == IDENTIFIER_GROUP:
+                text = intern(match[group])
+                yield Token(keywords.get(text, identifier), text, None, line)
+            elif group == OPERATOR_GROUP:
+                text = match[group]
+                yield Token(OPERATORS[text], text, None, line)
+            elif group == NEWLINE_GROUP:
+                line += 1
+            elif group == NUMBER_GROUP:
+                text = match[group]
+                yield Token(number, text, float(text), line)
+            elif group == COMMENT_GROUP:
+                pass
+            elif group == STRING_GROUP:
+                # 字符串可以跨行, token 的行号是字符串结束的那一行
+                text = match[group]
+                line += text.count('\n')
+                yield Token(TokenType.STRING, text, text[1:-1], line)
+            elif group == UNTERMINATED_GROUP:
+                line += match[group].count('\n')
+                error(line, 'Unterminated string.')
+            else:
+                error(line, 'Unexpected character.')
+
+        self.line = line
+        self.current = len(self.source)
+        yield Token(TokenType.EOF, '', None, line)
+
+    def scan_buffer(self) -> 'TokenBuffer':
+        """扫描整个源码, 结果存成 TokenBuffer 而不是 Token 对象的列表"""
+        buffer = TokenBuffer(self.source)
+        append = buffer.append
+        keywords = self.keywords
+        identifier = TokenType.IDENTIFIER.value
+        line = self.line
+
+        for match in TOKEN_PATTERN.finditer(self.source):
+            group = match.lastindex
+            if group == IDENTIFIER_GROUP:
+                type_ = keywords.get(match[group])
+                append(identifier if type_ is None else type_.value, match, group, line)
+            elif group == OPERATOR_GROUP:
+                append(OPERATORS[match[group]].value, match, group, line)
+            elif group == NEWLINE_GROUP:
+                line += 1
+            elif group == NUMBER_GROUP:
+                append(TokenType.NUMBER.value, match, group, line)
+            elif group == COMMENT_GROUP:
+                pass
+            elif group == STRING_GROUP:
+                line += match[group].count('\n')
+                append(TokenType.STRING.value, match, group, line)
+            elif group == UNTERMINATED_GROUP:
+                line += match[group].count('\n')
+                error(line, 'Unterminated string.')
+            else:
+                error(line, 'Unexpected character.')
+
+        self.line = line
+        self.current = len(self.source)
+        buffer.append_eof(line)
+        return buffer
+
+
+TOKEN_TYPES = {type_.value: type_ for type_ in TokenType}
+
+
+class TokenBuffer:
+    """
+    按列存放的 token 序列: 类型, 起始位置, 长度和行号各占一个 array, 每个 token 十几个字节.
+    下标访问时才从源码中切出词素并构造 Token, Parser 可以像使用列表一样使用它.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.types = array('B')
+        self.starts = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+        # Parser 会反复访问当前和上一个 token, 缓存最近构造的两个
+        self.cache: dict[int, Token] = {}
+
+    def append(self, type_: int, match: re.Match, group: int, line: int):
+        start, end = match.span(group)
+        self.types.append(type_)
+        self.starts.append(start)
+        self.lengths.append(end - start)
+        self.lines.append(line)
+
+    def append_eof(self, line: int):
+        self.types.append(TokenType.EOF.value)
+        self.starts.append(len(self.source))
+        self.lengths.append(0)
+        self.lines.append(line)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Token:
+        if index < 0:
+            index += len(self.types)
+        token = self.cache.get(index)
+        if token is None:
+            if len(self.cache) >= 2:
+                self.cache.clear()
+            token = self.cache[index] = self.token(index)
+        return token
+
+    def token(self, index: int) -> Token:
+        type_ = TOKEN_TYPES[self.types[index]]
+        start = self.starts[index]
+        lexeme = self.source[start : start + self.lengths[index]]
+        if type_ == TokenType.NUMBER:
+            return Token(type_, lexeme, float(lexeme), self.lines[index])
+        if type_ == TokenType.STRING:
+            return Token(type_, lexeme, lexeme[1:-1], self.lines[index])
+        if type_ == TokenType.IDENTIFIER:
+            lexeme = sys.intern(lexeme)
+        return Token(type_, lexeme, None, self.lines[index])
@@ -0,0 +1,89 @@
+"""
+--stats 用到的统计: 每个阶段的耗时和内存峰值, 以及树解释器运行时的计数.
+"""
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, TextIO
+
+from lox.counters import walk
+from lox.Expr import Call
+from lox.interpreter import Environment, Interpreter
+from lox.Stmt import For, Stmt, Var
+
+
+class StatsInterpreter(Interpreter):
+    """统计创建的环境数, 调用次数和执行的语句数, 只在 --stats 时替换普通的 Interpreter"""
+
+    def __init__(self):
+        super().__init__()
+        self.environments = 0
+        self.calls = 0
+        self.statements = 0
+
+    def execute(self, stmt: Stmt) -> tuple[object] | None:
+        self.statements += 1
+        return self.dispatch[stmt.kind](stmt)
+
+    def execute_block(self, statements: List[Stmt], environment: Environment):
+        # 每次函数调用和声明了变量的 Block 都会带着一个新的环境进来
+        self.environments += 1
+        return super().execute_block(statements, environment)
+
+    def visitForStmt(self, stmt: For):
+        # 循环变量的环境不经过 execute_block
+        if isinstance(stmt.initializer, Var):
+            self.environments += 1
+        return super().visitForStmt(stmt)
+
+    def visitCallExpr(self, expr: Call):
+        self.calls += 1
+        return super().visitCallExpr(expr)
+
+
+class Stats:
+    def __init__(self, memory: bool = False):
+        # tracemalloc 会让执行慢好几倍, 只在需要内存数据时打开
+        self.memory = memory
+        # (阶段, 秒, 内存峰值字节数)
+        self.phases: list[tuple[str, float, int | None]] = []
+        self.counts: dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        tracing = tracemalloc.is_tracing()
+        if self.memory and not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+            self.phases.append((name, elapsed, peak))
+            if self.memory and not tracing:
+                tracemalloc.stop()
+
+    def count_nodes(self, statements: List[Stmt]):
+        self.counts['AST nodes'] = sum(1 for _ in walk(statements, None))
+
+    def count_runtime(self, interpreter: Interpreter):
+        if isinstance(interpreter, StatsInterpreter):
+            self.counts['environments'] = interpreter.environments
+            self.counts['calls'] = interpreter.calls
+            self.counts['statements executed'] = interpreter.statements
+
+    def report(self, out: TextIO = sys.stderr):
+        header = f'{"phase":<12}{"wall ms":>12}'
+        if self.memory:
+            header += f'{"peak KiB":>12}'
+        out.write(f'\n{header}\n')
+        for name, elapsed, peak in self.phases:
+            memory = '' if peak is None else f'{peak / 1024:>12.0f}'
+            out.write(f'{name:<12}{elapsed * 1000:>12.1f}{memory}\n')
+        total = sum(elapsed for _, elapsed, _ in self.phases)
+        out.write(f'{"total":<12}{total * 1000:>12.1f}\n\n')
+        for name, value in self.counts.items():
+            out.write(f'{name:<20}{value:>12}\n')
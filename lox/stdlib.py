@@ -0,0 +1,227 @@
+"""
+Lox 的标准库. 字符串拼接, 数学运算和容器操作直接在 Python 里完成, 比写成 Lox 循环快得多.
+列表就是 Python 的 list, 映射就是 dict, 键只能是字符串或数字.
+"""
+import math
+import time
+
+from lox.error import LoxRuntimeError
+from lox.natives import native
+
+
+def fail(message: str):
+    raise LoxRuntimeError(None, message)
+
+
+def number(value: object) -> float:
+    if type(value) is not float:
+        fail('Argument must be a number.')
+    return value
+
+
+def string(value: object) -> str:
+    if type(value) is not str:
+        fail('Argument must be a string.')
+    return value
+
+
+def array(value: object) -> list:
+    if type(value) is not list:
+        fail('Argument must be a list.')
+    return value
+
+
+def mapping(value: object) -> dict:
+    if type(value) is not dict:
+        fail('Argument must be a map.')
+    return value
+
+
+def integer(value: object) -> int:
+    if type(value) is not float or not value.is_integer():
+        fail('Argument must be an integer.')
+    return int(value)
+
+
+def index(items: list | str, value: object) -> int:
+    i = integer(value)
+    if not 0 <= i < len(items):
+        fail('Index out of range.')
+    return i
+
+
+def key(value: object) -> str | float:
+    # true == 1.0 在 Python 里成立, 为了不混淆只允许字符串和数字做键
+    if type(value) is not str and type(value) is not float:
+        fail('Map key must be a string or a number.')
+    return value
+
+
+@native('clock', 0)
+def clock():
+    return time.time()
+
+
+# 字符串
+
+
+@native('str', 1, interpreter=True)
+def str_(interpreter, value):
+    return interpreter.stringify(value)
+
+
+@native('len', 1)
+def len_(value):
+    if type(value) not in (str, list, dict):
+        fail('Argument must be a string, list or map.')
+    return float(len(value))
+
+
+@native('substr', 3)
+def substr(value, start, end):
+    value = string(value)
+    start = integer(start)
+    end = integer(end)
+    if not 0 <= start <= end <= len(value):
+        fail('Index out of range.')
+    return value[start:end]
+
+
+@native('join', 2, interpreter=True)
+def join(interpreter, items, separator):
+    return string(separator).join(map(interpreter.stringify, array(items)))
+
+
+@native('split', 2)
+def split(value, separator):
+    if string(separator) == '':
+        fail('Separator must not be empty.')
+    return string(value).split(separator)
+
+
+@native('repeat', 2)
+def repeat(value, count):
+    count = integer(count)
+    if count < 0:
+        fail('Count must not be negative.')
+    return string(value) * count
+
+
+# 数学
+
+
+@native('abs', 1)
+def abs_(value):
+    return abs(number(value))
+
+
+@native('floor', 1)
+def floor(value):
+    value = number(value)
+    # inf 和 nan 没有整数部分, 原样返回
+    return float(math.floor(value)) if math.isfinite(value) else value
+
+
+@native('sqrt', 1)
+def sqrt(value):
+    value = number(value)
+    return math.sqrt(value) if value >= 0 else math.nan
+
+
+@native('pow', 2)
+def pow_(base, exponent):
+    try:
+        return math.pow(number(base), number(exponent))
+    except OverflowError:
+        return math.inf
+    except ValueError:
+        return math.nan
+
+
+@native('min', 2)
+def min_(a, b):
+    return min(number(a), number(b))
+
+
+@native('max', 2)
+def max_(a, b):
+    return max(number(a), number(b))
+
+
+# 列表
+
+
+@native('list', 0)
+def list_():
+    return []
+
+
+@native('push', 2)
+def push(items, value):
+    array(items).append(value)
+    return None
+
+
+@native('pop', 1)
+def pop(items):
+    if not array(items):
+        fail('Pop from empty list.')
+    return items.pop()
+
+
+@native('get', 2)
+def get(items, i):
+    return array(items)[index(items, i)]
+
+
+@native('set', 3)
+def set_(items, i, value):
+    array(items)[index(items, i)] = value
+    return value
+
+
+# 映射
+
+
+@native('map', 0)
+def map_():
+    return {}
+
+
+@native('mapGet', 2)
+def map_get(table, k):
+    return mapping(table).get(key(k))
+
+
+@native('mapSet', 3)
+def map_set(table, k, value):
+    mapping(table)[key(k)] = value
+    return value
+
+
+@native('mapHas', 2)
+def map_has(table, k):
+    return key(k) in mapping(table)
+
+
+@native('keys', 1)
+def keys(table):
+    return list(mapping(table))
+
+
+# 文件
+
+
+@native('readFile', 1)
+def read_file(path):
+    try:
+        with open(string(path), 'r', encoding='utf-8') as f:
+            return f.read()
+    except (OSError, ValueError):
+        # ValueError 包括不是 UTF-8 的文件 (UnicodeDecodeError)
+        fail(f'Could not read file "{path}".')
+
+
+@native('readLines', 1)
+def read_lines(path):
+    return read_file(path).splitlines()
@@ -1,34 +1,89 @@
 import sys
+from typing import List
 
-from lox.Expr import *
-from lox.scanner import TokenType
+from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
+from lox.Expr import Visitor as eVisitor
+from lox.scanner import Token, TokenType
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var
+from lox.Stmt import Visitor as sVisitor
+from lox.Stmt import While
 
 
-class AstPrinter(Visitor):
-    def print(self, expr: Expr):
-        return expr.accept(self)
+class AstPrinter(eVisitor, sVisitor):
+    """把语法树打印成 S 表达式, 可以用来比较不同解析器生成的树"""
+
+    def print(self, node: Expr | Stmt):
+        return node.accept(self)
+
+    def print_program(self, statements: List[Stmt]) -> str:
+        return '\n'.join(self.print(statement) for statement in statements)
+
+    def visitAssignExpr(self, expr: Assign) -> str:
+        return self.parenthesize(f'= {expr.name.lexeme}', expr.value)
 
     def visitBinaryExpr(self, expr: Binary) -> str:
         return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
 
+    def visitCallExpr(self, expr: Call) -> str:
+        return self.parenthesize('call', expr.callee, *expr.arguments)
+
     def visitGroupingExpr(self, expr: Grouping) -> str:
         return self.parenthesize('group', expr.expression)
 
     def visitLiteralExpr(self, expr: Literal) -> str:
         if expr.value == None:
             return 'nil'
+        if isinstance(expr.value, str):
+            return f'"{expr.value}"'
         return str(expr.value)
 
+    def visitLogicalExpr(self, expr: Logical) -> str:
+        return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+
     def visitUnaryExpr(self, expr: Unary) -> str:
         return self.parenthesize(expr.operator.lexeme, expr.right)
 
-    def parenthesize(self, name: str, *exprs: [Expr]):
+    def visitVariableExpr(self, expr: Variable) -> str:
+        return expr.name.lexeme
+
+    def visitBlockStmt(self, stmt: Block) -> str:
+        return self.parenthesize('block', *stmt.statements)
+
+    def visitExpressionStmt(self, stmt: Expression) -> str:
+        return self.parenthesize(';', stmt.expression)
+
+    def visitForStmt(self, stmt: For) -> str:
+        return self.parenthesize(
+            'for', stmt.initializer, stmt.condition, stmt.increment, stmt.body
+        )
+
+    def visitFunctionStmt(self, stmt: Function) -> str:
+        params = ' '.join(param.lexeme for param in stmt.params)
+        return self.parenthesize(f'fun {stmt.name.lexeme} ({params})', *stmt.body)
+
+    def visitIfStmt(self, stmt: If) -> str:
+        return self.parenthesize('if', stmt.condition, stmt.thenBranch, stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Print) -> str:
+        return self.parenthesize('print', stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return) -> str:
+        return self.parenthesize('return', stmt.value)
+
+    def visitVarStmt(self, stmt: Var) -> str:
+        return self.parenthesize(f'var {stmt.name.lexeme}', stmt.initializer)
+
+    def visitWhileStmt(self, stmt: While) -> str:
+        return self.parenthesize('while', stmt.condition, stmt.body)
+
+    def parenthesize(self, name: str, *nodes: Expr | Stmt | None):
         str_list = []
         str_list.append('(')
         str_list.append(name)
-        for expr in exprs:
+        for node in nodes:
             str_list.append(' ')
-            str_list.append(expr.accept(self))
+            # 可以省略的部分 (比如 for 的条件) 打印成 _
+            str_list.append('_' if node is None else node.accept(self))
         str_list.append(')')
         return ''.join(str_list)
 
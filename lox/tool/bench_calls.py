@@ -0,0 +1,42 @@
+import sys
+import time
+
+from lox.core import Lox, engines
+from lox.output import NullOutput
+
+SOURCE = """\
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+print fib(%d);
+"""
+
+
+def calls(n: int) -> int:
+    # fib(n) 一共会调用 2 * fib(n + 1) - 1 次
+    a, b = 0, 1
+    for _ in range(n + 1):
+        a, b = b, a + b
+    return 2 * a - 1
+
+
+def measure(engine: str, n: int) -> float:
+    lox = Lox(engine, output=NullOutput())
+    statements = lox.parse(SOURCE % n)
+    start = time.perf_counter()
+    lox.execute(statements)
+    return time.perf_counter() - start
+
+
+def main(args):
+    n = int(args[1]) if len(args) > 1 else 22
+    count = calls(n)
+    print(f'fib({n}): {count} calls')
+    for engine in engines:
+        elapsed = measure(engine, n)
+        print(f'{engine:>8}: {elapsed:.2f}s, {count / elapsed:,.0f} calls/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
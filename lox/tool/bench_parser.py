@@ -0,0 +1,79 @@
+"""
+比较各个解析器前端: 递归下降的 Parser, Pratt 解析器和 (装了 lark 时) Lark 的 LALR 解析器.
+输出从源码到语法树 (包括扫描) 的时间, 生成的树是否相同, 以及在默认递归限制下能解析的括号嵌套深度.
+
+    python -m lox.tool.bench_parser [MB]
+"""
+import sys
+import time
+
+from lox.parser import Parser, PrattParser
+from lox.scanner import RegexScanner
+from lox.tool.bench_scanner import generate
+
+# 名字 -> 从源码解析出语句列表的函数
+FRONT_ENDS = {
+    'Parser': lambda source: Parser(RegexScanner(source).scan_tokens()).parse(),
+    'PrattParser': lambda source: PrattParser(RegexScanner(source).scan_tokens()).parse(),
+}
+try:
+    from lox.lark_parser import LarkParser, lark_parser
+except ImportError:
+    pass
+else:
+    FRONT_ENDS['LarkParser'] = lambda source: LarkParser(source).parse()
+
+
+def same_tree(a, b) -> bool:
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same_tree(x, y) for x, y in zip(a, b))
+    fields = getattr(a, '__match_args__', None)
+    if fields is None:
+        return a == b
+    return all(same_tree(getattr(a, field), getattr(b, field)) for field in fields)
+
+
+def measure(parse, source: str) -> tuple[float, list]:
+    start = time.perf_counter()
+    statements = parse(source)
+    return time.perf_counter() - start, statements
+
+
+def max_depth(parse, limit: int = 10000) -> int:
+    """二分查找不触发 RecursionError 的最大括号嵌套深度, 最多查到 limit"""
+    low, high = 0, limit
+    while low < high:
+        depth = (low + high + 1) // 2
+        try:
+            parse(f'print {"(" * depth}1{")" * depth};')
+            low = depth
+        except RecursionError:
+            high = depth - 1
+    return low
+
+
+def main(args):
+    megabytes = float(args[1]) if len(args) > 1 else 1
+    source = generate(int(megabytes * 1024 * 1024))
+    tokens = RegexScanner(source).scan_tokens()
+    print(f'source: {len(source) / 1024 / 1024:.1f} MB, {len(tokens)} tokens')
+    if 'LarkParser' in FRONT_ENDS:
+        # 第一次调用时才构造 (或从缓存读入) LALR 表, 不算在解析时间里
+        lark_parser()
+    trees = []
+    for name, parse in FRONT_ENDS.items():
+        elapsed, statements = measure(parse, source)
+        trees.append(statements)
+        print(
+            f'{name:>12}: {elapsed:.2f}s, {len(tokens) / elapsed:,.0f} tokens/s, '
+            f'max nesting {max_depth(parse)}'
+        )
+    if not all(same_tree(trees[0], tree) for tree in trees[1:]):
+        sys.exit('parsers produced different trees')
+    print('trees are identical')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
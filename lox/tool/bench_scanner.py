@@ -0,0 +1,70 @@
+"""
+比较扫描器: 逐字符的 Scanner, 正则的 RegexScanner, 以及 RegexScanner.scan_buffer 生成的按列存放的
+TokenBuffer. 输出吞吐量和扫描结果占用的内存 (tracemalloc 统计, 每个 token 的字节数).
+
+    python -m lox.tool.bench_scanner [MB]
+"""
+import sys
+import time
+import tracemalloc
+
+from lox.scanner import RegexScanner, Scanner
+
+SNIPPET = """\
+fun fib(n) {
+  // recursive fibonacci
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+var greeting = "hello" + " " + "world";
+for (var i = 0; i < 10; i = i + 1) {
+  print i * 3.25 >= 10 and !(i == 4) or nil;
+}
+"""
+
+
+def generate(size: int) -> str:
+    return SNIPPET * (size // len(SNIPPET) + 1)
+
+
+# 名字 -> 从源码扫描出 token 序列 (列表或 TokenBuffer) 的函数
+SCANS = {
+    'Scanner': lambda source: Scanner(source).scan_tokens(),
+    'RegexScanner': lambda source: RegexScanner(source).scan_tokens(),
+    'TokenBuffer': lambda source: RegexScanner(source).scan_buffer(),
+}
+
+
+def measure(scan, source: str) -> tuple[float, int]:
+    start = time.perf_counter()
+    tokens = scan(source)
+    return time.perf_counter() - start, len(tokens)
+
+
+def footprint(scan, source: str) -> int:
+    """扫描结果还留在内存里时占用的字节数"""
+    tracemalloc.start()
+    try:
+        tokens = scan(source)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del tokens
+    return size
+
+
+def main(args):
+    megabytes = float(args[1]) if len(args) > 1 else 4
+    source = generate(int(megabytes * 1024 * 1024))
+    print(f'source: {len(source) / 1024 / 1024:.1f} MB')
+    for name, scan in SCANS.items():
+        elapsed, count = measure(scan, source)
+        size = footprint(scan, source)
+        print(
+            f'{name:>12}: {count} tokens in {elapsed:.2f}s, {count / elapsed:,.0f} tokens/s, '
+            f'{size / count:.0f} B/token'
+        )
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,144 @@
+"""
+运行 benchmarks/ 下的 Lox 程序, 分别计时扫描, 解析和执行三个阶段, 并和保存的基线比较.
+某个阶段比基线慢出容差或者输出变了, 以状态 1 退出.
+
+    python -m lox.tool.benchmark                 运行全部并和 benchmarks/baseline.json 比较
+    python -m lox.tool.benchmark fib loops       只运行其中几个
+    python -m lox.tool.benchmark --save          把这次的结果保存为新的基线
+
+基线和机器有关, 换了机器要先 --save 一次.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+from lox.core import Lox, engines
+from lox.output import CaptureOutput
+from lox.parser import PrattParser
+from lox.scanner import RegexScanner
+from lox.tool.bench_scanner import generate
+
+BENCHMARK_DIR = Path(__file__).resolve().parents[2] / 'benchmarks'
+BASELINE = BENCHMARK_DIR / 'baseline.json'
+PHASES = ('scan', 'parse', 'execute')
+# 生成的大源码, 主要用来测扫描和解析的吞吐量
+LARGE = 'large'
+LARGE_SIZE = 512 * 1024
+# 比基线慢不到这么多秒时不算退化, 避免很短的阶段被噪声误判
+MIN_DELTA = 0.005
+
+
+def sources() -> dict[str, str]:
+    programs = {path.stem: path.read_text() for path in sorted(BENCHMARK_DIR.glob('*.lox'))}
+    programs[LARGE] = generate(LARGE_SIZE)
+    return programs
+
+
+def measure(source: str, engine: str, repeat: int) -> dict:
+    times = {phase: [] for phase in PHASES}
+    for _ in range(repeat):
+        # 每次都用新的引擎, 不受上一次留下的全局变量影响
+        output = CaptureOutput()
+        lox = Lox(engine, output=output)
+        with lox.session.active():
+            start = time.perf_counter()
+            tokens = RegexScanner(source).scan_tokens()
+            scanned = time.perf_counter()
+            statements = PrattParser(tokens).parse()
+            parsed = time.perf_counter()
+            lox.execute(statements)
+            end = time.perf_counter()
+        if lox.session.exit_code():
+            raise SystemExit('benchmark failed')
+        times['scan'].append(scanned - start)
+        times['parse'].append(parsed - scanned)
+        times['execute'].append(end - parsed)
+    result = {phase: min(times[phase]) for phase in PHASES}
+    result['tokens'] = len(tokens)
+    # 输出可能很长, 只保存哈希, 用来发现结果变了
+    result['output'] = hashlib.sha256(output.getvalue().encode()).hexdigest()[:16]
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['output'] != expected['output']:
+            failures.append(f'{name}: output differs from baseline')
+        for phase in PHASES:
+            if (
+                result[phase] > expected[phase] * (1 + tolerance)
+                and result[phase] - expected[phase] > MIN_DELTA
+            ):
+                failures.append(
+                    f'{name} {phase}: {result[phase] * 1000:.1f}ms, '
+                    f'baseline {expected[phase] * 1000:.1f}ms '
+                    f'({result[phase] / expected[phase] - 1:+.0%})'
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m lox.tool.benchmark')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--engine', choices=engines, default='tree')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, best is kept')
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25, help='allowed slowdown (default: 0.25)'
+    )
+    parser.add_argument('--save', action='store_true', help='write the results as the baseline')
+    parser.add_argument('--output', type=Path, help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    programs = sources()
+    unknown = set(args.names) - set(programs)
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+    names = args.names or list(programs)
+
+    baseline = {}
+    if args.baseline.exists():
+        saved = json.loads(args.baseline.read_text())
+        if saved['engine'] == args.engine:
+            baseline = saved['benchmarks']
+
+    results = {}
+    print(f'{"benchmark":<12}{"tokens":>10}{"scan ms":>10}{"parse ms":>10}{"execute ms":>12}')
+    for name in names:
+        result = results[name] = measure(programs[name], args.engine, args.repeat)
+        print(
+            f'{name:<12}{result["tokens"]:>10}{result["scan"] * 1000:>10.1f}'
+            f'{result["parse"] * 1000:>10.1f}{result["execute"] * 1000:>12.1f}'
+        )
+
+    report = {'engine': args.engine, 'python': sys.version.split()[0], 'benchmarks': results}
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + '\n')
+    if args.save:
+        # 只更新这次运行过的程序, 其余的基线保留
+        report['benchmarks'] = {**baseline, **results}
+        args.baseline.write_text(json.dumps(report, indent=2) + '\n')
+        print(f'baseline saved to {args.baseline}')
+        return
+
+    failures = compare(results, baseline, args.tolerance)
+    if not baseline:
+        print(f'no {args.engine} baseline in {args.baseline}, run with --save first')
+    elif failures:
+        print('\nREGRESSION:', file=sys.stderr)
+        for failure in failures:
+            print(f'  {failure}', file=sys.stderr)
+        sys.exit(1)
+    else:
+        print(f'\nno regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,45 +3,85 @@ from pathlib import Path
 from typing import List
 
 
-def define_type(f, base_name: str, class_name: str, field_list: str):
+def define_type(f, base_name: str, class_name: str, field_list: str, kind: int, caches: List[str]):
     fields = []
+    names = []
     for field in field_list.split(', '):
         type_, param = field.strip().split(' ')
         fields.append(f"{param}: '{type_}'")
+        names.append(f"'{param}'")
+    slots = names + [f"'{cache}'" for cache in caches]
 
-    f.write(f'class {class_name}({base_name}):\n')
+    # 和前面的定义之间空两行, 文件末尾不留空行
+    f.write(f'\n\nclass {class_name}({base_name}):\n')
+    f.write(f'    __slots__ = {as_tuple(slots)}\n')
+    f.write(f'    __match_args__ = {as_tuple(names)}\n')
+    f.write(f'    kind = {kind}\n\n')
     f.write(f'    def __init__(self, {", ".join(fields)}):\n')
     for field in field_list.split(', '):
         name = field.split(' ')[1]
         f.write(f'        self.{name} = {name}\n')
+    if caches:
+        f.write('        # 解释器在运行时填写的缓存\n')
+    for cache in caches:
+        f.write(f'        self.{cache} = None\n')
     f.write('\n')
     f.write("    def accept(self, visitor: 'Visitor'):\n")
-    f.write(f'        return visitor.visit{class_name}{base_name}(self)\n\n\n')
+    f.write(f'        return visitor.visit{class_name}{base_name}(self)\n')
 
 
-def define_visitor(f, base_name: str, types: List[str]):
+def as_tuple(items: List[str]) -> str:
+    return f'({items[0]},)' if len(items) == 1 else f'({", ".join(items)})'
+
+
+def define_visitor(f, base_name: str, types: List[str], first_kind: int):
     f.write('class Visitor(ABC):\n')
+    f.write(f'    def {base_name.lower()}_dispatch(self) -> dict[int, Callable]:\n')
+    f.write(f'        """按节点的 kind 查找 visit 方法, 省掉 accept 这一层调用"""\n')
+    f.write(
+        '        return {kind: getattr(self, name) '
+        f'for kind, name in enumerate(VISIT_METHODS, {first_kind})}}\n'
+    )
     for type_ in types:
         type_name = type_.split(':')[0].strip()
-        f.write(f'    @abstractmethod\n')
+        f.write(f'\n    @abstractmethod\n')
         f.write(f"    def visit{type_name}{base_name}({base_name.lower()}: '{type_name}'):\n")
-        f.write(f'        pass\n\n')
+        f.write(f'        pass\n')
 
 
-def define_ast(output_dir: str, base_name: str, types: List[str]):
+def define_ast(
+    output_dir: str,
+    base_name: str,
+    types: List[str],
+    first_kind: int = 0,
+    caches: dict[str, List[str]] | None = None,
+):
+    """
+    生成 base_name 及其子类. 每个子类有 __slots__ 和一个整数 kind,
+    Expr 和 Stmt 的 kind 互不重叠 (Stmt 从 first_kind 开始编号).
+    caches 给某些节点加上不在构造参数里的缓存字段, __match_args__ 只包含构造参数.
+    """
+    caches = caches or {}
     path = Path(output_dir) / f'{base_name}.py'
     with open(path, 'w', encoding='utf-8') as f:
-        f.write('from abc import ABC, abstractmethod\n\n')
+        f.write('from abc import ABC, abstractmethod\n')
+        f.write('from typing import Callable\n\n')
         f.write('from lox.scanner import Token\n\n\n')
         f.write(f'class {base_name}(ABC):\n')
+        f.write('    __slots__ = ()\n')
+        f.write('    kind: int\n\n')
         f.write(f'    @abstractmethod\n')
         f.write(f"    def accept(self, visitor: 'Visitor'):\n        pass\n\n\n")
-        define_visitor(f, base_name, types)
+        f.write('VISIT_METHODS = (\n')
         for type_ in types:
+            class_name = type_.split(':')[0].strip()
+            f.write(f"    'visit{class_name}{base_name}',\n")
+        f.write(')\n\n\n')
+        define_visitor(f, base_name, types, first_kind)
+        for kind, type_ in enumerate(types, first_kind):
             class_name = type_.split(':')[0].strip()
             fields = type_.split(':')[1].strip()
-            define_type(f, base_name, class_name, fields)
-        f.write('\n')
+            define_type(f, base_name, class_name, fields, kind, caches.get(class_name, []))
 
 
 def main():
@@ -49,19 +89,26 @@ def main():
         sys.stderr.write('Usage: generate_ast <output directory>\n')
         exit(64)
     output_dir = sys.argv[1]
+    expr_types = [
+        'Assign   : Token name, Expr value',
+        'Binary   : Expr left, Token operator, Expr right',
+        'Call     : Expr callee, Token paren, List[Expr] arguments',
+        'Grouping : Expr expression',
+        'Literal  : object value',
+        'Logical  : Expr left, Token operator, Expr right',
+        'Unary    : Token operator, Expr right',
+        'Variable : Token name',
+    ]
     define_ast(
         output_dir,
         'Expr',
-        [
-            'Assign   : Token name, Expr value',
-            'Binary   : Expr left, Token operator, Expr right',
-            'Call     : Expr callee, Token paren, List[Expr] arguments',
-            'Grouping : Expr expression',
-            'Literal  : object value',
-            'Logical  : Expr left, Token operator, Expr right',
-            'Unary    : Token operator, Expr right',
-            'Variable : Token name',
-        ],
+        expr_types,
+        caches={
+            # 数字运算的特化, 见 Interpreter.visitBinaryExpr
+            'Binary': ['specialized', 'warmup'],
+            # 全局变量的内联缓存, 见 Interpreter.visitVariableExpr
+            'Variable': ['cached_version', 'cached_value'],
+        },
     )
     define_ast(
         output_dir,
@@ -69,6 +116,7 @@ def main():
         [
             'Block      : List[Stmt] statements',
             'Expression : Expr expression',
+            'For        : Stmt initializer, Expr condition, Expr increment, Stmt body',
             'Function   : Token name, List[Token] params, List[Stmt] body',
             'If         : Expr condition, Stmt thenBranch, Stmt elseBranch',
             'Print      : Expr expression',
@@ -76,6 +124,11 @@ def main():
             'Return     : Token keyword, Expr value',
             'While      : Expr condition, Stmt body',
         ],
+        len(expr_types),
+        caches={
+            # 块里是否直接声明了变量, 由 Resolver 填写; 没有声明的块不创建新环境
+            'Block': ['scoped'],
+        },
     )
 
 
@@ -0,0 +1,597 @@
+import builtins
+import warnings
+from types import FunctionType, TracebackType
+from typing import List
+
+from lox import natives
+from lox.error import LoxRuntimeError, runtime_error
+from lox.Expr import Assign, Binary, Call, Expr, Grouping, Literal, Logical, Unary, Variable
+from lox.Expr import Visitor as eVisitor
+from lox.interpreter import LoxCallable, divide, stringify
+from lox.output import StdoutOutput
+from lox.scanner import Token, TokenType
+from lox.Stmt import Block, Expression, For, Function, If, Print, Return, Stmt, Var
+from lox.Stmt import Visitor as sVisitor
+from lox.Stmt import While
+
+
+class Binding:
+    """一个局部变量声明. 被内层函数捕获的变量用单元素列表装箱."""
+
+    def __init__(self, python_name: str, function: Function | None):
+        self.python_name = python_name
+        # 声明该变量的函数, None 表示顶层代码
+        self.function = function
+        self.captured = False
+
+
+class ScopeAnalyzer(eVisitor, sVisitor):
+    """
+    生成代码之前的作用域分析: 给每个局部变量起一个唯一的 Python 名字,
+    找出被闭包捕获的变量, 以及每个函数需要从外层带进来的变量.
+    """
+
+    def __init__(self):
+        self.scopes: List[dict[str, Binding]] = []
+        self.functions: List[Function | None] = [None]
+        self.declarations: dict[Stmt, Binding] = {}
+        self.params: dict[Function, List[Binding]] = {}
+        self.references: dict[Expr, Binding] = {}
+        # 函数 -> 它用到的外层变量 (有序集合)
+        self.free: dict[Function, dict[Binding, None]] = {}
+        # 函数 -> 需要 global 声明的全局变量名
+        self.global_writes: dict[Function | None, set[str]] = {None: set()}
+        self.count = 0
+
+    def analyze(self, statements: List[Stmt]):
+        for statement in statements:
+            statement.accept(self)
+
+    def declare(self, name: Token) -> Binding | None:
+        if not self.scopes:
+            self.global_writes[self.functions[-1]].add(name.lexeme)
+            return None
+        self.count += 1
+        binding = Binding(f'_{self.count}_{name.lexeme}', self.functions[-1])
+        self.scopes[-1][name.lexeme] = binding
+        return binding
+
+    def resolve(self, expr: Expr, name: Token):
+        for scope in reversed(self.scopes):
+            binding = scope.get(name.lexeme)
+            if binding is None:
+                continue
+            self.references[expr] = binding
+            for function in reversed(self.functions):
+                if function is binding.function:
+                    break
+                binding.captured = True
+                self.free.setdefault(function, {})[binding] = None
+            return
+        if isinstance(expr, Assign):
+            self.global_writes[self.functions[-1]].add(name.lexeme)
+
+    def visitBlockStmt(self, stmt: Block):
+        self.scopes.append({})
+        self.analyze(stmt.statements)
+        self.scopes.pop()
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression.accept(self)
+
+    def visitForStmt(self, stmt: For):
+        self.scopes.append({})
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        if stmt.condition is not None:
+            stmt.condition.accept(self)
+        if stmt.increment is not None:
+            stmt.increment.accept(self)
+        stmt.body.accept(self)
+        self.scopes.pop()
+
+    def visitFunctionStmt(self, stmt: Function):
+        binding = self.declare(stmt.name)
+        if binding is not None:
+            self.declarations[stmt] = binding
+        self.functions.append(stmt)
+        self.global_writes[stmt] = set()
+        self.scopes.append({})
+        self.params[stmt] = [self.declare(param) for param in stmt.params]
+        self.analyze(stmt.body)
+        self.scopes.pop()
+        self.functions.pop()
+
+    def visitIfStmt(self, stmt: If):
+        stmt.condition.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+
+    def visitPrintStmt(self, stmt: Print):
+        stmt.expression.accept(self)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        binding = self.declare(stmt.name)
+        if binding is not None:
+            self.declarations[stmt] = binding
+
+    def visitWhileStmt(self, stmt: While):
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visitAssignExpr(self, expr: Assign):
+        expr.value.accept(self)
+        self.resolve(expr, expr.name)
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitCallExpr(self, expr: Call):
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        expr.expression.accept(self)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right.accept(self)
+
+    def visitVariableExpr(self, expr: Variable):
+        self.resolve(expr, expr.name)
+
+
+# 表达式的静态类型, 已知是数字或字符串时可以省掉运行时的类型检查
+NUMBER = 'number'
+STRING = 'string'
+BOOLEAN = 'boolean'
+
+
+class PythonGenerator(eVisitor, sVisitor):
+    """
+    把 Lox 语句翻译成 Python 源码. 顶层代码放进 _lox_main 函数里, 这样块作用域里的变量
+    都是 Python 的局部变量; Lox 的全局变量加上 l_ 前缀存放在模块命名空间中.
+    """
+
+    def __init__(self, analyzer: ScopeAnalyzer, functions: dict[str, str]):
+        self.analyzer = analyzer
+        # 生成的函数名 -> (打印时的名字, 参数个数), 由 PythonInterpreter 跨多次运行共享
+        self.functions = functions
+        self.lines: List[str] = []
+        # 第 i 行 Python 代码对应的 Lox 行号
+        self.line_map: List[int] = []
+        self.indent = 0
+        self.line = 0
+        self.temps = 0
+
+    def generate(self, statements: List[Stmt]) -> str:
+        self.emit('def _lox_main():')
+        self.indent += 1
+        self.emit_globals(None)
+        start = len(self.lines)
+        for statement in statements:
+            self.stmt(statement)
+        if len(self.lines) == start:
+            self.emit('pass')
+        self.indent -= 1
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, text: str):
+        self.lines.append('    ' * self.indent + text)
+        self.line_map.append(self.line)
+
+    def emit_globals(self, function: Function | None):
+        names = self.analyzer.global_writes.get(function)
+        if names:
+            self.emit(f'global {", ".join("l_" + name for name in sorted(names))}')
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f'_t{self.temps}'
+
+    def suite(self, stmt: Stmt):
+        self.indent += 1
+        start = len(self.lines)
+        self.stmt(stmt)
+        if len(self.lines) == start:
+            self.emit('pass')
+        self.indent -= 1
+
+    def stmt(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def expr(self, expr: Expr) -> tuple[str, str | None]:
+        return expr.accept(self)
+
+    def condition(self, expr: Expr) -> str:
+        code, kind = self.expr(expr)
+        if kind == BOOLEAN:
+            return code
+        t = self.temp()
+        return f'({t} := {code}) is not None and {t} is not False'
+
+    def is_pure(self, expr: Expr) -> bool:
+        while isinstance(expr, Grouping):
+            expr = expr.expression
+        if isinstance(expr, Literal):
+            return True
+        return isinstance(expr, Variable) and expr in self.analyzer.references
+
+    # 语句
+
+    def visitBlockStmt(self, stmt: Block):
+        for statement in stmt.statements:
+            self.stmt(statement)
+
+    def visitExpressionStmt(self, stmt: Expression):
+        if isinstance(stmt.expression, Assign):
+            self.assign_statement(stmt.expression)
+            return
+        code, _ = self.expr(stmt.expression)
+        self.emit(code)
+
+    def assign_statement(self, expr: Assign):
+        value, _ = self.expr(expr.value)
+        self.line = expr.name.line
+        binding = self.analyzer.references.get(expr)
+        if binding is None:
+            # Lox 先求值再检查变量是否存在
+            t = self.temp()
+            name = expr.name.lexeme
+            self.emit(f'{t} = {value}')
+            self.emit(f"if 'l_{name}' not in _G: _undefined({name!r}, {self.line})")
+            self.emit(f'l_{name} = {t}')
+        elif binding.captured:
+            self.emit(f'{binding.python_name}[0] = {value}')
+        else:
+            self.emit(f'{binding.python_name} = {value}')
+
+    def visitFunctionStmt(self, stmt: Function):
+        self.line = stmt.name.line
+        name = f'_f{len(self.functions)}'
+        self.functions[name] = f'<fn {stmt.name.lexeme}>'
+
+        params = self.analyzer.params[stmt]
+        signature = [param.python_name for param in params]
+        free = self.analyzer.free.get(stmt, {})
+        if free:
+            # 外层变量的箱子在定义函数时绑定到仅限关键字参数的默认值上
+            signature.append('*')
+            signature.extend(f'{b.python_name}={b.python_name}' for b in free)
+
+        binding = self.analyzer.declarations.get(stmt)
+        if binding is not None and binding.captured:
+            self.emit(f'{binding.python_name} = [None]')
+        self.emit(f'def {name}({", ".join(signature)}):')
+        self.indent += 1
+        start = len(self.lines)
+        self.emit_globals(stmt)
+        for param in params:
+            if param.captured:
+                self.emit(f'{param.python_name} = [{param.python_name}]')
+        for statement in stmt.body:
+            self.stmt(statement)
+        if len(self.lines) == start:
+            self.emit('pass')
+        self.indent -= 1
+
+        self.line = stmt.name.line
+        if binding is None:
+            self.emit(f'l_{stmt.name.lexeme} = {name}')
+        elif binding.captured:
+            self.emit(f'{binding.python_name}[0] = {name}')
+        else:
+            self.emit(f'{binding.python_name} = {name}')
+
+    def visitIfStmt(self, stmt: If):
+        self.emit(f'if {self.condition(stmt.condition)}:')
+        self.suite(stmt.thenBranch)
+        if stmt.elseBranch is not None:
+            self.emit('else:')
+            self.suite(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Print):
+        code, _ = self.expr(stmt.expression)
+        self.emit(f'_print(_stringify({code}))')
+
+    def visitReturnStmt(self, stmt: Return):
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self.emit('return None')
+            return
+        code, _ = self.expr(stmt.value)
+        self.emit(f'return {code}')
+
+    def visitVarStmt(self, stmt: Var):
+        self.line = stmt.name.line
+        code = 'None' if stmt.initializer is None else self.expr(stmt.initializer)[0]
+        binding = self.analyzer.declarations.get(stmt)
+        if binding is None:
+            self.emit(f'l_{stmt.name.lexeme} = {code}')
+        elif binding.captured:
+            self.emit(f'{binding.python_name} = [{code}]')
+        else:
+            self.emit(f'{binding.python_name} = {code}')
+
+    def visitForStmt(self, stmt: For):
+        if stmt.initializer is not None:
+            self.stmt(stmt.initializer)
+        if stmt.condition is None:
+            self.emit('while True:')
+        else:
+            self.emit(f'while {self.condition(stmt.condition)}:')
+        self.indent += 1
+        start = len(self.lines)
+        self.stmt(stmt.body)
+        if stmt.increment is not None:
+            self.stmt(Expression(stmt.increment))
+        if len(self.lines) == start:
+            self.emit('pass')
+        self.indent -= 1
+
+    def visitWhileStmt(self, stmt: While):
+        self.emit(f'while {self.condition(stmt.condition)}:')
+        self.suite(stmt.body)
+
+    # 表达式, 返回 (Python 代码, 静态类型)
+
+    def visitAssignExpr(self, expr: Assign):
+        value, kind = self.expr(expr.value)
+        self.line = expr.name.line
+        binding = self.analyzer.references.get(expr)
+        if binding is None:
+            return f'_assign_global({expr.name.lexeme!r}, {value}, {self.line})', kind
+        if binding.captured:
+            return f'_assign_box({binding.python_name}, {value})', kind
+        return f'({binding.python_name} := {value})', kind
+
+    def visitBinaryExpr(self, expr: Binary):
+        left, left_kind = self.expr(expr.left)
+        right, right_kind = self.expr(expr.right)
+        self.line = expr.operator.line
+        fail = f'_fail({self.line}, {{!r}})'
+
+        if expr.operator.type == TokenType.PLUS:
+            if left_kind == right_kind and left_kind in (NUMBER, STRING):
+                return f'({left} + {right})', left_kind
+            if left_kind in (NUMBER, STRING) and self.is_pure(expr.left):
+                b = self.temp()
+                check = f'type({b} := {right}) is {_PYTHON_TYPES[left_kind]}'
+                message = fail.format('Operands must be two numbers or strings.')
+                return f'({left} + {b} if {check} else {message})', left_kind
+            if right_kind in (NUMBER, STRING) and self.is_pure(expr.right):
+                a = self.temp()
+                check = f'type({a} := {left}) is {_PYTHON_TYPES[right_kind]}'
+                message = fail.format('Operands must be two numbers or strings.')
+                return f'({a} + {right} if {check} else {message})', right_kind
+            a, b = self.temp(), self.temp()
+            check = f'type({a} := {left}) is type({b} := {right}) is float or type({a}) is type({b}) is str'
+            message = fail.format('Operands must be two numbers or strings.')
+            return f'({a} + {b} if {check} else {message})', None
+
+        op, kind = _NUMBER_OPERATORS[expr.operator.type]
+        message = fail.format('Operands must be a number.')
+        if left_kind == right_kind == NUMBER:
+            return op.format(left, right), kind
+        # 纯的操作数后求值也不会改变语义, 只需要检查另一边
+        if left_kind == NUMBER and self.is_pure(expr.left):
+            b = self.temp()
+            return f'({op.format(left, b)} if type({b} := {right}) is float else {message})', kind
+        if right_kind == NUMBER and self.is_pure(expr.right):
+            a = self.temp()
+            return f'({op.format(a, right)} if type({a} := {left}) is float else {message})', kind
+        a, b = self.temp(), self.temp()
+        check = f'type({a} := {left}) is type({b} := {right}) is float'
+        return f'({op.format(a, b)} if {check} else {message})', kind
+
+    def visitCallExpr(self, expr: Call):
+        callee, _ = self.expr(expr.callee)
+        arguments = [self.expr(argument)[0] for argument in expr.arguments]
+        self.line = expr.paren.line
+        # Lox 函数和原生函数都是位置参数个数等于 arity 的 Python 函数, 调用前检查类型和参数个数.
+        # 检查失败时仍然先求值参数, 和其他引擎的求值顺序一致
+        t = self.temp()
+        count = len(arguments)
+        check = f'type({t} := {callee}) is _function and {t}.__code__.co_argcount == {count}'
+        error = f'_call_error({", ".join([t, str(self.line), *arguments])})'
+        return f'({t}({", ".join(arguments)}) if {check} else {error})', None
+
+    def visitGroupingExpr(self, expr: Grouping):
+        return self.expr(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal):
+        value = expr.value
+        if value is None:
+            return 'None', None
+        if isinstance(value, bool):
+            return repr(value), BOOLEAN
+        if isinstance(value, float):
+            return repr(value), NUMBER
+        return repr(value), STRING
+
+    def visitLogicalExpr(self, expr: Logical):
+        left, left_kind = self.expr(expr.left)
+        right, right_kind = self.expr(expr.right)
+        kind = left_kind if left_kind == right_kind else None
+        is_or = expr.operator.type == TokenType.OR
+        if left_kind == BOOLEAN:
+            # 布尔值的真假和 Python 一致, 直接用 and/or
+            return f'({left} {"or" if is_or else "and"} {right})', kind
+        t = self.temp()
+        truthy = f'({t} := {left}) is not None and {t} is not False'
+        if is_or:
+            return f'({t} if {truthy} else {right})', kind
+        return f'({right} if {truthy} else {t})', kind
+
+    def visitUnaryExpr(self, expr: Unary):
+        right, kind = self.expr(expr.right)
+        self.line = expr.operator.line
+        if expr.operator.type == TokenType.MINUS:
+            if kind == NUMBER:
+                return f'(-{right})', NUMBER
+            t = self.temp()
+            message = f"_fail({self.line}, 'Operand must be a number.')"
+            return f'(-{t} if type({t} := {right}) is float else {message})', NUMBER
+        if kind == BOOLEAN:
+            return f'(not {right})', BOOLEAN
+        t = self.temp()
+        return f'(({t} := {right}) is None or {t} is False)', BOOLEAN
+
+    def visitVariableExpr(self, expr: Variable):
+        self.line = expr.name.line
+        binding = self.analyzer.references.get(expr)
+        if binding is None:
+            return f'l_{expr.name.lexeme}', None
+        if binding.captured:
+            return f'{binding.python_name}[0]', None
+        return binding.python_name, None
+
+
+# 运算的代码模板和结果类型. Python 的除以零会抛异常, 交给 divide 得到 inf 或 nan
+_NUMBER_OPERATORS = {
+    TokenType.MINUS: ('({} - {})', NUMBER),
+    TokenType.SLASH: ('_divide({}, {})', NUMBER),
+    TokenType.STAR: ('({} * {})', NUMBER),
+    TokenType.GREATER: ('({} > {})', BOOLEAN),
+    TokenType.GREATER_EQUAL: ('({} >= {})', BOOLEAN),
+    TokenType.LESS: ('({} < {})', BOOLEAN),
+    TokenType.LESS_EQUAL: ('({} <= {})', BOOLEAN),
+    TokenType.BANG_EQUAL: ('({} != {})', BOOLEAN),
+    TokenType.EQUAL_EQUAL: ('({} == {})', BOOLEAN),
+}
+
+
+_PYTHON_TYPES = {NUMBER: 'float', STRING: 'str'}
+
+
+def line_token(line: int) -> Token:
+    return Token(TokenType.EOF, '', None, line)
+
+
+class PythonInterpreter:
+    """
+    把 Lox 程序翻译成 Python 源码后交给 CPython 编译执行.
+    类型检查, 真假判断和调用前的参数个数检查都内联在生成的代码里; 未定义变量不在热路径上检查,
+    而是把 Python 抛出的 NameError 翻译回 LoxRuntimeError, 行号通过行号表找回.
+    """
+
+    def __init__(self):
+        # 生成的 Python 函数名 -> 打印出来的样子
+        self.functions: dict[str, str] = {'_native': '<native fn>'}
+        self.line_maps: dict[str, List[int]] = {}
+        self.output = StdoutOutput()
+        self.namespace: dict[str, object] = {
+            '__builtins__': builtins,
+            '_stringify': self.stringify,
+            '_fail': self.fail,
+            '_divide': divide,
+            '_function': FunctionType,
+            '_call_error': self.call_error,
+            '_undefined': self.undefined,
+            '_assign_global': self.assign_global,
+            '_assign_box': self.assign_box,
+        }
+        self.namespace['_G'] = self.namespace
+
+        for name, function in natives.load().items():
+            self.define_native(name, function)
+
+    def define_native(self, name: str, callable_: LoxCallable):
+        # 生成一个位置参数个数等于 arity 的包装函数, 调用处就能和 Lox 函数一样检查参数个数
+        params = ', '.join(f'a{i}' for i in range(callable_.arity()))
+        namespace = {'call': callable_.call, 'interpreter': self}
+        exec(f'def _native({params}):\n    return call(interpreter, [{params}])', namespace)
+        self.namespace[f'l_{name}'] = namespace['_native']
+
+    def resolve(self, expr: Expr, depth: int, slot: int):
+        # ScopeAnalyzer 自己处理作用域, 不需要 Resolver 的结果
+        pass
+
+    def translate(self, statements: List[Stmt]) -> tuple[str, List[int]]:
+        analyzer = ScopeAnalyzer()
+        analyzer.analyze(statements)
+        generator = PythonGenerator(analyzer, self.functions)
+        return generator.generate(statements), generator.line_map
+
+    def interpret(self, statements: List[Stmt]):
+        source, line_map = self.translate(statements)
+        filename = f'<lox-{len(self.line_maps)}>'
+        self.line_maps[filename] = line_map
+        with warnings.catch_warnings():
+            # 生成的代码是给机器看的, 即使有 Python 会警告的写法也不该把警告打到 stderr 上
+            warnings.simplefilter('ignore')
+            code = compile(source, filename, 'exec')
+        exec(code, self.namespace)
+        # output 可能在创建之后被换掉, 每次运行前重新绑定
+        self.namespace['_print'] = self.output.print
+        try:
+            self.namespace.pop('_lox_main')()
+        except LoxRuntimeError as e:
+            if e.token is None:
+                e = LoxRuntimeError(line_token(self.error_line(e.__traceback__)), str(e))
+            runtime_error(e)
+        except NameError as e:
+            if e.name is None or not e.name.startswith('l_'):
+                raise
+            line = self.error_line(e.__traceback__)
+            runtime_error(LoxRuntimeError(line_token(line), f'Undefined variable "{e.name[2:]}".'))
+        except RecursionError as e:
+            line = self.error_line(e.__traceback__)
+            runtime_error(LoxRuntimeError(line_token(line), 'Stack overflow.'))
+        finally:
+            self.output.flush()
+
+    def error_line(self, traceback: TracebackType) -> int:
+        line = 0
+        while traceback is not None:
+            line_map = self.line_maps.get(traceback.tb_frame.f_code.co_filename)
+            if line_map is not None:
+                line = line_map[traceback.tb_lineno - 1]
+            traceback = traceback.tb_next
+        return line
+
+    def call_error(self, callee: object, line: int, *arguments: object):
+        if type(callee) is not FunctionType:
+            self.fail(line, 'Can only call functions and classes.')
+        arity = callee.__code__.co_argcount
+        self.fail(line, f'Expected {arity} arguments but got {len(arguments)}.')
+
+    def stringify(self, obj: object) -> str:
+        return stringify(obj, self.describe)
+
+    def describe(self, obj: object) -> str:
+        # Lox 函数编译成了 Python 函数, 按名字找回 <fn name>
+        if type(obj) is FunctionType:
+            return self.functions[obj.__name__]
+        return str(obj)
+
+    def fail(self, line: int, message: str):
+        raise LoxRuntimeError(line_token(line), message)
+
+    def undefined(self, name: str, line: int):
+        raise LoxRuntimeError(line_token(line), f'Undefined variable "{name}".')
+
+    def assign_global(self, name: str, value: object, line: int):
+        if f'l_{name}' not in self.namespace:
+            self.undefined(name, line)
+        self.namespace[f'l_{name}'] = value
+        return value
+
+    def assign_box(self, box: List[object], value: object):
+        box[0] = value
+        return value
@@ -0,0 +1,360 @@
+from typing import List
+
+from lox import natives
+from lox.compiler import (
+    OP_ADD,
+    OP_CALL,
+    OP_CLOSE_UPVALUE,
+    OP_CLOSURE,
+    OP_CONSTANT,
+    OP_DEFINE_GLOBAL,
+    OP_DIVIDE,
+    OP_EQUAL,
+    OP_FALSE,
+    OP_GET_GLOBAL,
+    OP_GET_LOCAL,
+    OP_GET_UPVALUE,
+    OP_GREATER,
+    OP_GREATER_EQUAL,
+    OP_JUMP,
+    OP_JUMP_IF_FALSE,
+    OP_LESS,
+    OP_LESS_EQUAL,
+    OP_LOOP,
+    OP_MULTIPLY,
+    OP_NEGATE,
+    OP_NIL,
+    OP_NOT,
+    OP_POP,
+    OP_PRINT,
+    OP_RETURN,
+    OP_SET_GLOBAL,
+    OP_SET_LOCAL,
+    OP_SET_UPVALUE,
+    OP_SUBTRACT,
+    OP_TAIL_CALL,
+    OP_TRUE,
+    Compiler,
+    LoxVMFunction,
+)
+from lox.error import LoxRuntimeError, runtime_error
+from lox.Expr import Expr
+from lox.interpreter import LoxCallable, divide, stringify
+from lox.output import StdoutOutput
+from lox.scanner import Token, TokenType
+from lox.Stmt import Stmt
+
+# 默认的调用深度上限, 尾调用不计入
+FRAMES_MAX = 1024
+
+
+class Upvalue:
+    """
+    被闭包捕获的变量. 变量还在栈上时 cells 就是 VM 的栈, 离开作用域后换成只有一个元素的列表,
+    这样读写 upvalue 时不需要判断它是否已经关闭.
+    """
+
+    __slots__ = ('cells', 'index')
+
+    def __init__(self, cells: List[object], index: int):
+        self.cells = cells
+        self.index = index
+
+    def close(self):
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class Closure:
+    __slots__ = ('function', 'upvalues')
+
+    def __init__(self, function: LoxVMFunction, upvalues: List[Upvalue]):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __str__(self):
+        return str(self.function)
+
+
+class CallFrame:
+    __slots__ = ('closure', 'ip', 'base')
+
+    def __init__(self, closure: Closure, ip: int, base: int):
+        self.closure = closure
+        self.ip = ip
+        # 该函数的 slot 0 在栈上的位置
+        self.base = base
+
+
+class VM:
+    """
+    执行 lox.compiler 生成的字节码的栈式虚拟机.
+    Lox 的调用栈就是 frames 列表, 不占用 Python 的栈, 深度只受 max_frames 限制.
+    """
+
+    def __init__(self, max_frames: int = FRAMES_MAX):
+        if max_frames < 1:
+            raise ValueError('max_frames must be at least 1')
+        self.max_frames = max_frames
+        self.stack: List[object] = []
+        self.frames: List[CallFrame] = []
+        # 还在栈上的 upvalue: 栈下标 -> Upvalue
+        self.open_upvalues: dict[int, Upvalue] = {}
+        self.globals_: dict[str, object] = {}
+        self.output = StdoutOutput()
+
+        for name, function in natives.load().items():
+            self.define_native(name, function)
+
+    def define_native(self, name: str, function: LoxCallable):
+        self.globals_[name] = function
+
+    def stringify(self, obj: object) -> str:
+        return stringify(obj)
+
+    def resolve(self, expr: Expr, depth: int, slot: int):
+        # Compiler 自己分配栈上的 slot, 不需要 Resolver 的结果
+        pass
+
+    def interpret(self, statements: List[Stmt]):
+        function = Compiler().compile(statements)
+        if function is None:
+            return
+        closure = Closure(function, [])
+        self.stack.append(closure)
+        self.frames.append(CallFrame(closure, 0, 0))
+        try:
+            self.run()
+        except LoxRuntimeError as e:
+            runtime_error(e)
+            self.stack.clear()
+            self.frames.clear()
+            self.open_upvalues.clear()
+        finally:
+            self.output.flush()
+
+    def error(self, frame: CallFrame, ip: int, message: str) -> LoxRuntimeError:
+        line = frame.closure.function.chunk.lines[ip - 1]
+        return LoxRuntimeError(Token(TokenType.EOF, '', None, line), message)
+
+    def close_upvalues(self, last: int):
+        for index in [index for index in self.open_upvalues if index >= last]:
+            self.open_upvalues.pop(index).close()
+
+    def capture_upvalue(self, index: int) -> Upvalue:
+        upvalue = self.open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = self.open_upvalues[index] = Upvalue(self.stack, index)
+        return upvalue
+
+    def call_native(self, frame: CallFrame, ip: int, callee: object, argc: int):
+        if not isinstance(callee, LoxCallable):
+            raise self.error(frame, ip, 'Can only call functions and classes.')
+        if argc != callee.arity():
+            raise self.error(frame, ip, f'Expected {callee.arity()} arguments but got {argc}.')
+        stack = self.stack
+        arguments = stack[len(stack) - argc :]
+        del stack[len(stack) - argc - 1 :]
+        try:
+            stack.append(callee.call(self, arguments))
+        except LoxRuntimeError as e:
+            if e.token is None:
+                raise self.error(frame, ip, str(e)) from None
+            raise
+
+    def run(self):
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        frames = self.frames
+        max_frames = self.max_frames
+        globals_ = self.globals_
+        output = self.output.print
+
+        frame = frames[-1]
+        closure = frame.closure
+        chunk = closure.function.chunk
+        code = chunk.code
+        constants = chunk.constants
+        ip = frame.ip
+        base = frame.base
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            # 按执行频率大致排序
+            if op == OP_GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == OP_CONSTANT:
+                push(constants[(code[ip] << 8) | code[ip + 1]])
+                ip += 2
+            elif op == OP_SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == OP_POP:
+                pop()
+            elif op == OP_JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += (code[ip] << 8) | code[ip + 1]
+                ip += 2
+            elif op == OP_LOOP:
+                ip -= ((code[ip] << 8) | code[ip + 1]) - 2
+            elif op == OP_JUMP:
+                ip += ((code[ip] << 8) | code[ip + 1]) + 2
+            elif op == OP_ADD:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a + b
+                elif type(a) is str and type(b) is str:
+                    stack[-1] = a + b
+                else:
+                    raise self.error(frame, ip, 'Operands must be two numbers or strings.')
+            elif OP_EQUAL <= op <= OP_DIVIDE:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise self.error(frame, ip, 'Operands must be a number.')
+                if op == OP_LESS:
+                    stack[-1] = a < b
+                elif op == OP_SUBTRACT:
+                    stack[-1] = a - b
+                elif op == OP_MULTIPLY:
+                    stack[-1] = a * b
+                elif op == OP_DIVIDE:
+                    stack[-1] = divide(a, b)
+                elif op == OP_GREATER:
+                    stack[-1] = a > b
+                elif op == OP_LESS_EQUAL:
+                    stack[-1] = a <= b
+                elif op == OP_GREATER_EQUAL:
+                    stack[-1] = a >= b
+                elif op == OP_EQUAL:
+                    stack[-1] = a == b
+                else:
+                    stack[-1] = a != b
+            elif op == OP_GET_GLOBAL:
+                name = constants[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                try:
+                    push(globals_[name])
+                except KeyError:
+                    raise self.error(frame, ip, f'Undefined variable "{name}".') from None
+            elif op == OP_GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                push(upvalue.cells[upvalue.index])
+                ip += 1
+            elif op == OP_SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                upvalue.cells[upvalue.index] = stack[-1]
+                ip += 1
+            elif op == OP_CALL:
+                argc = code[ip]
+                ip += 1
+                callee = stack[-1 - argc]
+                if type(callee) is Closure:
+                    function = callee.function
+                    if argc != function.arity:
+                        raise self.error(
+                            frame, ip, f'Expected {function.arity} arguments but got {argc}.'
+                        )
+                    if len(frames) >= max_frames:
+                        raise self.error(frame, ip, 'Stack overflow.')
+                    frame.ip = ip
+                    frame = CallFrame(callee, 0, len(stack) - argc - 1)
+                    frames.append(frame)
+                    closure = callee
+                    chunk = function.chunk
+                    code = chunk.code
+                    constants = chunk.constants
+                    ip = 0
+                    base = frame.base
+                else:
+                    frame.ip = ip
+                    self.call_native(frame, ip, callee, argc)
+            elif op == OP_RETURN:
+                result = pop()
+                if self.open_upvalues:
+                    self.close_upvalues(base)
+                frames.pop()
+                del stack[base:]
+                if not frames:
+                    return
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                chunk = closure.function.chunk
+                code = chunk.code
+                constants = chunk.constants
+                ip = frame.ip
+                base = frame.base
+            elif op == OP_TAIL_CALL:
+                argc = code[ip]
+                ip += 1
+                callee = stack[-1 - argc]
+                if type(callee) is Closure:
+                    function = callee.function
+                    if argc != function.arity:
+                        raise self.error(
+                            frame, ip, f'Expected {function.arity} arguments but got {argc}.'
+                        )
+                    # 当前函数的局部变量不再需要, 被调用的函数和参数移到当前帧的位置
+                    if self.open_upvalues:
+                        self.close_upvalues(base)
+                    stack[base:] = stack[len(stack) - argc - 1 :]
+                    frame = frames[-1] = CallFrame(callee, 0, base)
+                    closure = callee
+                    chunk = function.chunk
+                    code = chunk.code
+                    constants = chunk.constants
+                    ip = 0
+                else:
+                    # 原生函数照常调用, 紧跟着的 OP_RETURN 返回它的结果
+                    frame.ip = ip
+                    self.call_native(frame, ip, callee, argc)
+            elif op == OP_NIL:
+                push(None)
+            elif op == OP_TRUE:
+                push(True)
+            elif op == OP_FALSE:
+                push(False)
+            elif op == OP_NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op == OP_NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise self.error(frame, ip, 'Operand must be a number.')
+                stack[-1] = -value
+            elif op == OP_PRINT:
+                output(stringify(pop()))
+            elif op == OP_SET_GLOBAL:
+                name = constants[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                if name not in globals_:
+                    raise self.error(frame, ip, f'Undefined variable "{name}".')
+                globals_[name] = stack[-1]
+            elif op == OP_DEFINE_GLOBAL:
+                globals_[constants[(code[ip] << 8) | code[ip + 1]]] = pop()
+                ip += 2
+            elif op == OP_CLOSURE:
+                function = constants[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                upvalues = []
+                for _ in range(function.upvalue_count):
+                    is_local = code[ip]
+                    index = code[ip + 1]
+                    ip += 2
+                    if is_local:
+                        upvalues.append(self.capture_upvalue(base + index))
+                    else:
+                        upvalues.append(closure.upvalues[index])
+                push(Closure(function, upvalues))
+            elif op == OP_CLOSE_UPVALUE:
+                self.close_upvalues(len(stack) - 1)
+                pop()
+            else:
+                raise self.error(frame, ip, f'Unknown opcode {op}.')
@@ -0,0 +1,112 @@
+import argparse
+import functools
+import io
+from pathlib import Path
+
+import pytest
+
+from lox.core import Lox, engines, positive
+from lox.error import Session
+from lox.output import CaptureOutput
+from lox.vm import VM
+
+ROOT = Path(__file__).parent
+# 基准程序覆盖正常路径, tests/lox 里是闭包, 控制流, 标准库和各种编译错误, 运行时错误
+SCRIPTS = sorted((ROOT.parent / 'benchmarks').glob('*.lox')) + sorted((ROOT / 'lox').glob('*.lox'))
+
+COUNT = """\
+fun count(n, total) {
+  if (n == 0) return total;
+  return count(n - 1, total + n);
+}
+print count(100000, 0);
+"""
+
+DEPTH = """\
+fun depth(n) {
+  if (n == 0) return 0;
+  return depth(n - 1) + 1;
+}
+print depth(%d);
+"""
+
+COUNTER = """\
+fun counter() {
+  var n = 0;
+  fun add(step) {
+    n = n + step;
+    return n;
+  }
+  return add;
+}
+var a = counter();
+var b = counter();
+for (var i = 1; i <= 3; i = i + 1) {
+  a(i);
+  b(1);
+}
+print a(0);
+print b(0);
+"""
+
+
+def run(engine, path=None, source=None, interpreter=None):
+    stderr = io.StringIO()
+    output = CaptureOutput()
+    lox = Lox(engine, interpreter, session=Session(stderr), output=output)
+    if path is None:
+        lox.run(source)
+        status = lox.session.exit_code()
+    else:
+        status = lox.run_file(str(path), use_cache=False)
+    return output.getvalue(), stderr.getvalue(), status
+
+
+@functools.cache
+def expected(path):
+    return run('tree', path)
+
+
+@pytest.mark.parametrize('engine', [engine for engine in engines if engine != 'tree'])
+@pytest.mark.parametrize('path', SCRIPTS, ids=lambda path: f'{path.parent.name}/{path.name}')
+def test_same_as_tree(engine, path):
+    assert run(engine, path) == expected(path)
+
+
+def test_corpus_has_errors():
+    statuses = {expected(path)[2] for path in SCRIPTS}
+    assert statuses == {0, 65, 70}
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_upvalues(engine):
+    assert run(engine, source=COUNTER) == ('6\n3\n', '', 0)
+
+
+def test_vm_tail_call():
+    # 尾调用复用当前帧, 递归深度远超 max_frames 也不会溢出
+    assert run('vm', source=COUNT, interpreter=VM(max_frames=16)) == ('5000050000\n', '', 0)
+
+
+def test_vm_max_depth():
+    assert run('vm', source=DEPTH % 40, interpreter=VM(max_frames=50)) == ('40\n', '', 0)
+    assert run('vm', source=DEPTH % 60, interpreter=VM(max_frames=50)) == (
+        '',
+        'Stack overflow.\n[line 3]\n',
+        70,
+    )
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_stack_overflow(engine):
+    _, stderr, status = run(engine, source=DEPTH % 100000)
+    assert stderr.startswith('Stack overflow.\n')
+    assert status == 70
+
+
+def test_max_depth_must_be_positive():
+    with pytest.raises(ValueError):
+        VM(max_frames=0)
+    with pytest.raises(argparse.ArgumentTypeError):
+        positive('0')
+    assert positive('8') == 8
@@ -0,0 +1,30 @@
+import io
+
+import pytest
+
+from lox.core import Lox, engines
+from lox.error import Session
+from lox.output import CaptureOutput
+
+# 除以零和 clox 一样得到 inf 或 nan; 常量折叠, 特化后的 Binary 和常量表都要保持 -0 的符号
+DIVISION = """\
+print 1 / 0;
+print -1 / 0;
+print 0 / 0;
+print 1 / -0;
+var zero = 0;
+fun divide(a, b) { return a / b; }
+for (var i = -1; i < 11; i = i + 1) print divide(i, zero);
+print 7 / 2;
+"""
+
+EXPECTED = 'inf\n-inf\nnan\n-inf\n-inf\nnan\n' + 'inf\n' * 10 + '3.5\n'
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_division_by_zero(engine):
+    output = CaptureOutput()
+    lox = Lox(engine, session=Session(io.StringIO()), output=output)
+    lox.run(DIVISION)
+    assert lox.session.exit_code() == 0
+    assert output.getvalue() == EXPECTED
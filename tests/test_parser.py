@@ -0,0 +1,74 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from lox.error import Session
+from lox.lark_parser import LarkParser
+from lox.parser import Parser, PrattParser, StreamingParser
+from lox.scanner import RegexScanner
+from lox.tool.ast_printer import AstPrinter
+
+ROOT = Path(__file__).parent
+SCRIPTS = sorted((ROOT.parent / 'benchmarks').glob('*.lox')) + sorted((ROOT / 'lox').glob('*.lox'))
+
+PARSERS = {
+    'parser': lambda source: Parser(RegexScanner(source).scan_tokens()).parse(),
+    'pratt': lambda source: PrattParser(RegexScanner(source).scan_tokens()).parse(),
+    'streaming': lambda source: StreamingParser(RegexScanner(source).iter_tokens()).parse(),
+    'lark': lambda source: LarkParser(source).parse(),
+}
+
+ERRORS = [
+    'print 1 +;',
+    'var 1 = 2;',
+    'print 1;\n1 = 2;',
+    'fun f( {}',
+    'print (1;',
+    'if 1) print 2;',
+    'print 1\n',
+    '{ print 1;',
+    'for (;;',
+    'return;\nprint 1 2;',
+    'print "abc',
+    'var a = @;',
+]
+
+
+def parse(name, source):
+    stderr = io.StringIO()
+    with Session(stderr).active() as session:
+        statements = PARSERS[name](source)
+    return statements, stderr.getvalue(), session.exit_code()
+
+
+@pytest.mark.parametrize('path', SCRIPTS, ids=lambda path: f'{path.parent.name}/{path.name}')
+def test_same_tree(path):
+    source = path.read_text()
+    reference, stderr, status = parse('parser', source)
+    if status != 0:
+        pytest.skip(stderr)
+    expected = AstPrinter().print_program(reference)
+    for name in PARSERS:
+        statements, stderr, status = parse(name, source)
+        assert (stderr, status) == ('', 0), name
+        assert AstPrinter().print_program(statements) == expected, name
+
+
+@pytest.mark.parametrize('name', PARSERS)
+@pytest.mark.parametrize('source', ERRORS)
+def test_errors(name, source):
+    _, expected, _ = parse('parser', source)
+    _, stderr, status = parse(name, source)
+    assert status == 65
+    # lark 的报错信息不同, 只比较第一条错误的位置
+    if name == 'lark':
+        stderr, expected = stderr.split(':')[0], expected.split(':')[0]
+    assert stderr == expected
+
+
+def test_print():
+    statements, _, _ = parse('pratt', 'for (;;) print -a * ("b" + nil);')
+    assert AstPrinter().print_program(statements) == (
+        '(for _ _ _ (print (* (- a) (group (+ "b" nil)))))'
+    )
@@ -0,0 +1,45 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from lox.error import Session
+from lox.parser import PrattParser
+from lox.scanner import RegexScanner
+from lox.tool.bench_parser import same_tree
+
+BENCHMARKS = sorted((Path(__file__).resolve().parents[1] / 'benchmarks').glob('*.lox'))
+
+ERRORS = """\
+var a = "multi
+line";
+print a +;
+var 1 = 2;
+print "unterminated
+"""
+
+
+def fields(token):
+    return token.type, token.lexeme, token.literal, token.line
+
+
+@pytest.mark.parametrize('path', BENCHMARKS, ids=lambda path: path.stem)
+def test_token_buffer_matches_token_list(path):
+    source = path.read_text()
+    tokens = RegexScanner(source).scan_tokens()
+    buffer = RegexScanner(source).scan_buffer()
+    assert len(buffer) == len(tokens)
+    assert [fields(buffer[i]) for i in range(len(buffer))] == list(map(fields, tokens))
+    assert same_tree(PrattParser(buffer).parse(), PrattParser(tokens).parse())
+
+
+def test_token_buffer_reports_the_same_errors():
+    reports = []
+    for scan in (RegexScanner.scan_tokens, RegexScanner.scan_buffer):
+        stderr = io.StringIO()
+        with Session(stderr).active() as session:
+            PrattParser(scan(RegexScanner(ERRORS))).parse()
+        assert session.exit_code() == 65
+        reports.append(stderr.getvalue())
+    assert reports[0] == reports[1]
+    assert 'Unterminated string.' in reports[0]
@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from lox.core import Lox, engines
+from lox.error import Session
+from lox.output import CaptureOutput
+
+SOURCE = """\
+fun f() {}
+var items = list();
+push(items, f);
+push(items, clock);
+print str(f);
+print items;
+print str(items);
+print join(items, " ");
+"""
+
+EXPECTED = """\
+<fn f>
+[<fn f>, <native fn>]
+[<fn f>, <native fn>]
+<fn f> <native fn>
+"""
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_str_of_functions(engine):
+    output = CaptureOutput()
+    lox = Lox(engine, session=Session(io.StringIO()), output=output)
+    lox.run(SOURCE)
+    assert lox.session.exit_code() == 0
+    assert output.getvalue() == EXPECTED
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('function', ['readFile', 'readLines'])
+def test_read_invalid_utf8(engine, function, tmp_path):
+    path = tmp_path / 'binary.dat'
+    path.write_bytes(b'\xff\xfe\x00')
+    stderr = io.StringIO()
+    lox = Lox(engine, session=Session(stderr), output=CaptureOutput())
+    lox.run(f'{function}("{path}");')
+    assert lox.session.exit_code() == 70
+    assert stderr.getvalue() == f'Could not read file "{path}".\n[line 1]\n'